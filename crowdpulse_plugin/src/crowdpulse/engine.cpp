@@ -153,16 +153,14 @@ std::optional<ServerInfo> Engine::serverInfo() const
 void Engine::pushMetadataToApp(QString metadata)
 {
     auto url = webAppUrl();
-    url.setPath("/metadata");
-
-    const auto tracks = metadata.split('\n');
-    for (const auto& track: tracks)
-    {
-        m_httpClient.doPost(
-            url,
-            nx::network::http::header::ContentType::kJson.toString(),
-            track.toStdString());
-    }
+    url.setPath("/metadata/batch");
+
+    // Metadata is newline-delimited JSON, one track per line: the webapp parses the whole
+    // blob in one request.
+    m_httpClient.doPost(
+        url,
+        "application/x-ndjson",
+        metadata.toStdString());
 }
 
 void Engine::pushDiagEvent(DiagEvent event) const
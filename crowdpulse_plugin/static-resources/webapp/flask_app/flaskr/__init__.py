@@ -2,11 +2,18 @@ import os
 
 from flask import Flask
 
+from . import archive_coverage
 from . import auth
+from . import caching
 from . import db
+from . import device_inventory
+from . import engagement_buffer
+from . import engagement_stream
 from . import engagement_threshold
 from . import events
 from . import handle_metadata
+from . import retention
+from . import track_fetcher
 
 
 def create_app(config=None):
@@ -14,6 +21,35 @@ def create_app(config=None):
     app.config.from_mapping(
         SECRET_KEY='dev',  # TODO: To be updated after active development phase is over
         DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        ENGAGEMENT_FLUSH_INTERVAL_MS=2000,
+        ENGAGEMENT_FLUSHER_TICK_MS=250,
+        ENGAGEMENT_RECENT_WINDOWS=150,  # Closed windows per camera kept in memory for /<event_id>/engagement
+        ENGAGEMENT_LOCAL_MAX_IDLE_SEC=30,  # Fall back to the Mediaserver once metadata stops coming
+        ENGAGEMENT_ALERT_HYSTERESIS=0.05,
+        ENGAGEMENT_WRITER_MAX_BATCH_SIZE=500,
+        ENGAGEMENT_WRITER_MAX_LATENCY_MS=500,
+        ENGAGEMENT_WRITER_MAX_RETRY_ROWS=50_000,  # Rows of failed batches kept to be written again
+        SQLITE_SYNCHRONOUS='NORMAL',
+        SQLITE_CACHE_SIZE=-16000,  # Negative value is in KiB
+        SQLITE_MMAP_SIZE=64 * 1024 * 1024,
+        SQLITE_BUSY_TIMEOUT_MS=5000,
+        SQLITE_MAX_IDLE_CONNECTIONS=8,
+        ENGAGEMENT_RAW_RETENTION_DAYS=7,
+        # Rollup resolution in milliseconds to retention in days, None to keep forever
+        ENGAGEMENT_ROLLUP_RETENTION_DAYS={10_000: 30, 60_000: 365, 600_000: None, 3_600_000: None},
+        ENGAGEMENT_RETENTION_BATCH_SIZE=5000,
+        ENGAGEMENT_RETENTION_INTERVAL_SEC=3600,  # 0 disables the in-process scheduler
+        ANALYTICS_FETCH_CONCURRENCY=8,  # Analytics track lookups sent to the Mediaserver at once
+        ANALYTICS_FETCH_TIMEOUT_SEC=10,
+        ANALYTICS_FETCH_DEADLINE_SEC=30,
+        ANALYTICS_EXPORT_CHUNK_SEC=600,  # Time range looked up at once when streaming tracks
+        ANALYTICS_CACHE_MAX_TRACKS=200_000,  # 0 disables the analytics track cache
+        ANALYTICS_CACHE_SETTLE_SEC=60,  # Newer tracks may still change and are not cached
+        ANALYTICS_CACHE_DIR=os.path.join(app.instance_path, 'analytics_tracks'),  # None keeps it in memory
+        DEVICE_INVENTORY_TTL_SEC=60,  # Cameras older than that are refreshed in the background
+        DEVICE_INVENTORY_JITTER=0.2,  # Fraction of the TTL the refresh interval varies by
+        ARCHIVE_CAMERA_DIRS={},  # Camera ID to its archive chunk directories; empty disables indexing
+        ARCHIVE_COVERAGE_SCAN_INTERVAL_SEC=60,
         )
     if config is None:
         app.config.from_pyfile('config.py', silent=True)
@@ -24,6 +60,15 @@ def create_app(config=None):
     except OSError:
         pass
     db.init_app(app)
+    caching.init_app(app)
+    engagement_buffer.init_app(app)
+    engagement_threshold.init_app(app)
+    engagement_stream.init_app(app)
+    handle_metadata.init_app(app)
+    retention.init_app(app)
+    track_fetcher.init_app(app)
+    device_inventory.init_app(app)
+    archive_coverage.init_app(app)
     app.register_blueprint(auth.bp)
     app.register_blueprint(events.bp)
     app.register_blueprint(handle_metadata.bp)
@@ -30,6 +30,5 @@ if __name__ == '__main__':
             'MEDIASERVER_PORT': parsed_args.mediaserver_port,
             'WEBAPP_PORT': parsed_args.web_app_port,
             'RANDOM_CAMERA_DATA': {},
-            'TRACK_ENGAGEMENT_BUFFER': [],
             })
     app.run(debug=True, port=parsed_args.web_app_port)
@@ -0,0 +1,117 @@
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+from .http import HttpConnectionError, HttpReadTimeout
+from .http.api.plugin import PluginHttpError
+
+_logger = logging.getLogger(__name__)
+
+
+class _Alert(NamedTuple):
+    is_below: bool
+    camera_id: str
+    threshold: float
+
+
+class AlertDispatcher:
+    """Send engagement level alerts to the plugin from a worker thread.
+
+    An alert is only produced when a camera crosses its threshold: it goes below
+    once the rate drops under the threshold and back above once the rate exceeds
+    the threshold by the hysteresis margin. Undelivered alerts are kept one per
+    camera: a crossing back while the previous alert is still pending cancels
+    both, so a slow plugin never makes them pile up and never blocks the caller.
+    If the queue is full, the crossing is not recorded and is reported again
+    with the next rate; so is a crossing whose alert could not be delivered,
+    e.g. before the plugin API is set up.
+    """
+
+    def __init__(self, app, hysteresis: float = 0.05, max_pending: int = 1000):
+        self._app = app
+        self._hysteresis = hysteresis
+        self._max_pending = max_pending
+        self._is_below: dict[str, bool] = {}
+        self._pending: dict[str, _Alert] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='AlertDispatcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout_sec: float = 5):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout_sec)
+
+    def report(self, camera_id: str, rate: float, threshold: float) -> Optional[bool]:
+        """Return whether the camera went below (True) or above (False), None if nothing changed."""
+        with self._condition:
+            was_below = self._is_below.get(camera_id, False)
+            if not was_below and rate < threshold:
+                is_below = True
+            elif was_below and rate >= threshold + self._hysteresis:
+                is_below = False
+            else:
+                return None
+            if camera_id in self._pending:
+                # The pending alert is of the opposite crossing, the plugin needs neither of them.
+                del self._pending[camera_id]
+            elif len(self._pending) >= self._max_pending:
+                _logger.warning("Alert queue is full, dropping alert for camera %s", camera_id)
+                return None
+            else:
+                self._pending[camera_id] = _Alert(is_below, camera_id, threshold)
+                self._condition.notify()
+            self._is_below[camera_id] = is_below
+        return is_below
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                camera_id = next(iter(self._pending))
+                alert = self._pending.pop(camera_id)
+            self._send(alert)
+
+    def _send(self, alert: _Alert):
+        plugin_api = self._app.config.get('PLUGIN_API')
+        if plugin_api is None:
+            _logger.debug("Plugin API is not set up yet, skipping alert %s", alert)
+            self._forget(alert)
+            return
+        threshold_percent = alert.threshold * 100
+        if alert.is_below:
+            type_ = 'tigre.engagementBelowLevel'
+            caption = "ENGAGEMENT LEVEL DROP!"
+            description = f"Engagement level on camera is below the threshold {threshold_percent:.1f}%"
+        else:
+            type_ = 'tigre.engagementAboveLevel'
+            caption = "ENGAGEMENT LEVEL RESTORED"
+            description = f"Engagement level on camera is back above the threshold {threshold_percent:.1f}%"
+        try:
+            plugin_api.send_analytics_event(
+                type_=type_,
+                camera_id=alert.camera_id,
+                caption=caption,
+                description=description,
+                attributes={
+                    'camera_id': alert.camera_id,
+                    'threshold': alert.threshold,
+                    }
+                )
+        except (HttpConnectionError, HttpReadTimeout, PluginHttpError) as e:
+            _logger.warning("Failed to send %s alert for camera %s: %s", type_, alert.camera_id, e)
+            self._forget(alert)
+
+    def _forget(self, alert: _Alert):
+        with self._condition:
+            # A crossing back meanwhile has its alert pending, the plugin needs neither of them.
+            self._pending.pop(alert.camera_id, None)
+            self._is_below[alert.camera_id] = not alert.is_below
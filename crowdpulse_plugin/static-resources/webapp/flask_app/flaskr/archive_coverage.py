@@ -0,0 +1,172 @@
+import atexit
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Mapping, Optional, Sequence
+
+from .http.api.mediaserver import Interval, IntervalSet, TimePeriod
+
+_logger = logging.getLogger(__name__)
+
+# A directory changed this recently may change again within the same mtime tick.
+_MTIME_SETTLE_NS = 2_000_000_000
+
+
+class _ArchiveDir:
+    """Entries of one archive directory as of its modification time."""
+
+    __slots__ = ('mtime_ns', 'subdir_names', 'chunk_names', 'recorded')
+
+    def __init__(self):
+        self.mtime_ns: Optional[int] = None
+        self.subdir_names: set[str] = set()
+        self.chunk_names: set[str] = set()
+        self.recorded = IntervalSet()
+
+
+class _CameraCoverage:
+    """Recorded periods of one camera, and of each of its directories."""
+
+    __slots__ = ('recorded', 'dirs')
+
+    def __init__(self):
+        self.recorded = IntervalSet()
+        self.dirs: dict[str, _ArchiveDir] = {}
+
+
+class ArchiveCoverageIndex:
+    """Periods with recorded video of cameras, from the names of their archive chunks.
+
+    Each camera maps to the directories its chunks are stored in, laid out by time,
+    e.g. <storage>/hi_quality/<camera>/<YYYY>/<MM>/<DD>/<HH>. A scan stats every
+    indexed directory, but lists only the ones modified since the previous scan,
+    i.e. where chunks were added or deleted; only chunk names not seen before are
+    parsed. When the archive rotation deletes chunks or whole directories, only
+    their periods are forgotten.
+    """
+
+    def __init__(self, camera_dirs: Mapping[str, Sequence[str]], scan_interval_sec: float = 60):
+        self._camera_dirs = camera_dirs
+        self._scan_interval_sec = scan_interval_sec
+        self._cameras: dict[str, _CameraCoverage] = {}
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ArchiveCoverageIndex', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def has_camera(self, camera_id: str) -> bool:
+        return camera_id in self._camera_dirs
+
+    def recorded(self, camera_id: str, interval: Interval) -> IntervalSet:
+        """Parts of the interval with recorded video, as of the last scan."""
+        with self._lock:
+            coverage = self._cameras.get(camera_id)
+            if coverage is None:
+                return IntervalSet()
+            return IntervalSet(coverage.recorded.overlapping(interval))
+
+    def scan(self, camera_ids: Optional[Iterable[str]] = None):
+        with self._scan_lock:
+            for camera_id in self._camera_dirs if camera_ids is None else camera_ids:
+                with self._lock:
+                    coverage = self._cameras.setdefault(camera_id, _CameraCoverage())
+                removed = False
+                for directory in self._camera_dirs.get(camera_id, ()):
+                    removed |= self._scan_dir(coverage, directory, time.time_ns())
+                if removed:
+                    with self._lock:
+                        coverage.recorded = IntervalSet(itertools.chain.from_iterable(
+                            archive_dir.recorded for archive_dir in coverage.dirs.values()))
+
+    def _scan_dir(self, coverage: _CameraCoverage, path, now_ns) -> bool:
+        """Index new chunks under the path; return whether any indexed ones were deleted."""
+        archive_dir = coverage.dirs.get(path)
+        try:
+            stat = os.stat(path)
+            if archive_dir is None or archive_dir.mtime_ns != stat.st_mtime_ns:
+                entries = list(os.scandir(path))
+                subdir_names = {entry.name for entry in entries if entry.is_dir()}
+                chunk_names = {entry.name for entry in entries if entry.is_file()}
+            else:
+                entries = None
+        except FileNotFoundError:
+            if archive_dir is None:
+                return False
+            _logger.info("Archive directory %s is gone, forgetting its chunks", path)
+            _forget_below(coverage, path)
+            return True
+        except OSError as e:
+            # E.g. no permission; what was indexed under it is kept until it is readable again.
+            _logger.warning("Cannot scan archive directory %s: %s", path, e)
+            return False
+        if archive_dir is None:
+            archive_dir = coverage.dirs[path] = _ArchiveDir()
+        removed = False
+        if entries is not None:
+            for name in archive_dir.subdir_names - subdir_names:
+                _forget_below(coverage, os.path.join(path, name))
+                removed = True
+            if archive_dir.chunk_names - chunk_names:
+                archive_dir.recorded = IntervalSet(_chunk_intervals(chunk_names))
+                removed = True
+            else:
+                intervals = _chunk_intervals(chunk_names - archive_dir.chunk_names)
+                archive_dir.recorded.update(intervals)
+                with self._lock:
+                    coverage.recorded.update(intervals)
+            archive_dir.subdir_names = subdir_names
+            archive_dir.chunk_names = chunk_names
+            # Otherwise the directory is listed again by the next scan.
+            if now_ns - stat.st_mtime_ns > _MTIME_SETTLE_NS:
+                archive_dir.mtime_ns = stat.st_mtime_ns
+        for name in sorted(archive_dir.subdir_names):
+            removed |= self._scan_dir(coverage, os.path.join(path, name), now_ns)
+        return removed
+
+    def _run(self):
+        # The first scan is done here too, listing a large archive takes a while.
+        while not self._stopped.is_set():
+            try:
+                self.scan()
+            except Exception:
+                _logger.exception("Archive coverage scan failed")
+            self._stopped.wait(self._scan_interval_sec)
+
+
+def _forget_below(coverage: _CameraCoverage, path):
+    for indexed_path in [p for p in coverage.dirs if p == path or p.startswith(path + os.sep)]:
+        del coverage.dirs[indexed_path]
+
+
+def _chunk_intervals(names: Iterable[str]) -> list[Interval]:
+    # Finished chunks are named <start_ms>_<duration_ms>; the one being recorded has no duration yet.
+    intervals = []
+    for name in names:
+        try:
+            period = TimePeriod.from_filename(name)
+        except ValueError:  # Not a chunk
+            continue
+        if period.complete:
+            intervals.append(period.interval())
+    return intervals
+
+
+def init_app(app):
+    index = ArchiveCoverageIndex(
+        app.config['ARCHIVE_CAMERA_DIRS'],
+        scan_interval_sec=app.config['ARCHIVE_COVERAGE_SCAN_INTERVAL_SEC'],
+        )
+    app.config['ARCHIVE_COVERAGE'] = index
+    if app.config['ARCHIVE_CAMERA_DIRS']:
+        index.start()
+        atexit.register(index.stop)
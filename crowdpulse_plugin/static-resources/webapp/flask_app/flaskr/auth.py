@@ -5,7 +5,7 @@ from flask import (
 )
 
 from .common import format_uuid
-from .db import get_db
+from .db import get_db, get_read_db
 from .http import HttpConnectionError
 from .http.api.mediaserver import MediaserverApiV3, MediaserverApiConnectionError, MediaserverApiHttpError, NotFound
 from .http.api.plugin import PluginApi
@@ -76,7 +76,7 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        db = get_db()
+        db = get_read_db()
         g.user = db.execute(
             'SELECT * FROM user WHERE id = ?', (user_id,)).fetchone()
 
@@ -0,0 +1,123 @@
+import functools
+import gzip
+import hashlib
+import math
+import threading
+import time
+import zlib
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from flask import current_app, make_response, request, Response
+
+# Smaller bodies don't get noticeably smaller, compressing them only costs CPU.
+_MIN_COMPRESSED_SIZE = 512
+
+
+class DataVersions:
+    """Change counters of the data behind dashboard endpoints, e.g. a camera's engagement.
+
+    ETags combine the counters with a token of this process, so counters restarting
+    from zero after a restart never match an ETag issued before it.
+    """
+
+    def __init__(self):
+        self._started_at = time.time()
+        self._token = f'{int(self._started_at * 1000):x}'
+        self._versions: dict[Hashable, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, *keys: Hashable):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                [counter, _] = self._versions.get(key, (0, self._started_at))
+                self._versions[key] = (counter + 1, now)
+
+    def etag_and_last_modified(self, keys: Iterable[Hashable]) -> tuple[str, float]:
+        keys = list(keys)
+        with self._lock:
+            versions = [self._versions.get(key, (0, self._started_at)) for key in keys]
+        counters = repr([(key, counter) for key, (counter, _) in zip(keys, versions)])
+        etag = f'{self._token}-{hashlib.sha1(counters.encode()).hexdigest()[:16]}'
+        last_modified = max((modified_at for _, modified_at in versions), default=self._started_at)
+        return etag, last_modified
+
+
+def conditional(version_keys: Callable[..., Optional[Iterable[Hashable]]]):
+    """Answer GET requests with 304 Not Modified when the data behind the view hasn't changed.
+
+    version_keys receives the view arguments and returns the DataVersions keys of the data
+    the view reads, or None if the response can't be validated that way. The check happens
+    before the view runs, so an unchanged poll costs neither a DB query nor serialization.
+    """
+
+    def decorator(view):
+
+        @functools.wraps(view)
+        def wrapped_view(**kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(**kwargs)
+            keys = version_keys(**kwargs)
+            if keys is None:
+                return view(**kwargs)
+            versions = current_app.config['DATA_VERSIONS']
+            [etag, last_modified] = versions.etag_and_last_modified(keys)
+            # HTTP dates have whole seconds; rounded up, a change is never dated before a check.
+            last_modified = math.ceil(last_modified)
+            if _is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            # Weak, because the compressed representation shares the ETag.
+            response.set_etag(etag, weak=True)
+            # Until that second is over, the data may change again within it.
+            if last_modified <= time.time():
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+def _is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since.timestamp()
+    return False
+
+
+def compress_response(response: Response) -> Response:
+    """Compress large JSON responses with gzip or deflate, as the client accepts."""
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(('gzip', 'deflate'))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < _MIN_COMPRESSED_SIZE:
+        return response
+    if encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=5))
+    else:
+        response.set_data(zlib.compress(data, 5))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def bump_written_cameras(versions: DataVersions, rows: Iterable[tuple[Any, Any, str]]):
+    versions.bump(*{camera_id for _, _, camera_id in rows})
+
+
+def init_app(app):
+    versions = DataVersions()
+    app.config['DATA_VERSIONS'] = versions
+    app.config['ENGAGEMENT_RATE_WRITER'].add_written_listener(
+        functools.partial(bump_written_cameras, versions))
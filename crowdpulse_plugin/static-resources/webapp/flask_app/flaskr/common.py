@@ -1,5 +1,7 @@
 from uuid import UUID
 
+from werkzeug.http import http_date
+
 
 def format_uuid(id_: str | UUID, with_curly=False) -> str:
     if isinstance(id_, str):
@@ -11,3 +13,8 @@ def format_uuid(id_: str | UUID, with_curly=False) -> str:
     if with_curly:
         return '{' + template + '}'
     return template
+
+
+def format_timestamp_ms(timestamp_ms: int) -> str:
+    """Format milliseconds since epoch as an HTTP date, which is in UTC, for engagement points."""
+    return http_date(timestamp_ms / 1000)
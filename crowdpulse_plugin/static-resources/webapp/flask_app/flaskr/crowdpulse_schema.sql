@@ -35,3 +35,22 @@ CREATE TABLE If NOT EXISTS camera_engagement_rate (
   FOREIGN KEY (camera_id) REFERENCES camera (id),
   PRIMARY KEY (timestamp_, camera_id)
 );
+
+-- The primary key starts with the timestamp, so per-camera range queries need their own index.
+CREATE INDEX IF NOT EXISTS camera_engagement_rate_by_camera
+  ON camera_engagement_rate (camera_id, timestamp_, rate);
+
+CREATE TABLE IF NOT EXISTS camera_engagement_rollup (
+  camera_id TEXT NOT NULL,
+  resolution_ms INT NOT NULL,  -- Bucket size
+  bucket_ms INT NOT NULL,  -- Bucket start, milliseconds since epoch
+  count_ INT NOT NULL,
+  sum_ FLOAT NOT NULL,
+  min_ FLOAT NOT NULL,
+  max_ FLOAT NOT NULL,
+  FOREIGN KEY (camera_id) REFERENCES camera (id),
+  PRIMARY KEY (camera_id, resolution_ms, bucket_ms)
+);
+
+CREATE INDEX IF NOT EXISTS camera_engagement_rollup_by_bucket
+  ON camera_engagement_rollup (resolution_ms, bucket_ms);
@@ -1,24 +1,101 @@
+import atexit
+import logging
+import queue
 import sqlite3
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping
 
 import click
 from flask import current_app, g
 
+from .engagement_rollup import rebuild_rollups, update_rollups
+
+_logger = logging.getLogger(__name__)
+
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES,
-            )
-        g.db.row_factory = sqlite3.Row
+        g.db = current_app.config['DB_POOL'].acquire()
     return g.db
 
 
+def get_read_db():
+    """Return a read-only connection, which never blocks or is blocked by writers in WAL mode."""
+    if 'read_db' not in g:
+        g.read_db = current_app.config['READ_DB_POOL'].acquire()
+    return g.read_db
+
+
 def close_db(e=None):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        current_app.config['DB_POOL'].release(db)
+    read_db = g.pop('read_db', None)
+    if read_db is not None:
+        current_app.config['READ_DB_POOL'].release(read_db)
+
+
+def connect(database, pragmas: Mapping[str, Any], read_only=False) -> sqlite3.Connection:
+    if read_only:
+        connection = sqlite3.connect(
+            f'{Path(database).absolute().as_uri()}?mode=ro',
+            uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            )
+    else:
+        connection = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            )
+        # Both modes are persistent. Auto-vacuum can only be enabled for a new database here,
+        # retention switches existing ones over.
+        connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        connection.execute('PRAGMA journal_mode=WAL')
+    connection.row_factory = sqlite3.Row
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name}={value}')
+    return connection
+
+
+class ConnectionPool:
+    """Idle connections kept open for reuse by the threads serving requests.
+
+    A connection is used by one thread at a time, hence check_same_thread is off.
+    """
+
+    def __init__(self, database, pragmas: Mapping[str, Any], read_only=False, max_idle: int = 8):
+        self._database = database
+        self._pragmas = pragmas
+        self._read_only = read_only
+        self._max_idle = max_idle
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self._database, self._pragmas, read_only=self._read_only)
+
+    def release(self, connection: sqlite3.Connection):
+        if connection.in_transaction:
+            connection.rollback()
+        with self._lock:
+            if len(self._idle) < self._max_idle:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
 
 
 def init_db():
@@ -38,7 +115,190 @@ sqlite3.register_converter(
     "timestamp", lambda v: datetime.fromisoformat(v.decode()))
 
 
+class EngagementRateWriter:
+    """Write-behind writer of camera_engagement_rate rows.
+
+    A single thread owns a long-lived connection and inserts queued rows, one
+    transaction per batch, which also updates the rollups with the inserted ones.
+    A batch is written once it has max_batch_size rows or its oldest row has
+    waited for max_latency_sec. Rows of a batch that failed with an operational
+    error, e.g. a lock held longer than the busy timeout, are written again with
+    the next batch; beyond max_retry_rows of them the oldest are dropped.
+    """
+
+    def __init__(
+            self,
+            database,
+            pragmas: Mapping[str, Any],
+            max_batch_size: int = 500,
+            max_latency_sec: float = 0.5,
+            max_retry_rows: int = 50_000,
+            ):
+        self._database = database
+        self._pragmas = pragmas
+        self._max_batch_size = max_batch_size
+        self._max_latency_sec = max_latency_sec
+        self._max_retry_rows = max_retry_rows
+        self._queue = queue.SimpleQueue()
+        self._retry_rows = []
+        self._dropped_rows = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='EngagementRateWriter', daemon=True)
+        self._written_rows = 0
+        self._written_listeners = []
+
+    def add_written_listener(self, listener: Callable[[list[tuple[int, float, str]]], None]):
+        """Call the listener with the rows each batch inserted once it is committed, on the writer thread."""
+        self._written_listeners.append(listener)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Write all queued rows and stop the thread."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def write(self, rows: Iterable[tuple[int, float, str]]):
+        """Queue (timestamp_ms, rate, camera_id) rows for insertion."""
+        for row in rows:
+            self._queue.put(row)
+
+    def stats(self):
+        return {
+            'pending_rows': self._queue.qsize() + len(self._retry_rows),
+            'written_rows': self._written_rows,
+            'dropped_rows': self._dropped_rows,
+            }
+
+    def _run(self):
+        connection = connect(self._database, self._pragmas)
+        try:
+            while not self._stopped.is_set():
+                self._write_batch(connection, self._take_retry_rows() + self._collect_batch())
+            while not self._queue.empty():
+                self._write_batch(connection, self._take_retry_rows() + self._collect_batch())
+            # One more attempt for the rows that failed last.
+            self._write_batch(connection, self._take_retry_rows())
+            if self._retry_rows:
+                _logger.error("Dropping %d engagement rows not written before stop", len(self._retry_rows))
+                self._dropped_rows += len(self._retry_rows)
+                self._retry_rows = []
+        finally:
+            connection.close()
+
+    def _take_retry_rows(self):
+        rows = self._retry_rows
+        self._retry_rows = []
+        return rows
+
+    def _collect_batch(self):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self._max_latency_sec))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self._max_latency_sec
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or self._stopped.is_set():
+                timeout = 0
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, connection, batch):
+        if not batch:
+            return
+        try:
+            with connection:
+                # A window restarted within the same millisecond is ignored, so it is not rolled up twice.
+                inserted = _new_rows(connection, batch)
+                connection.executemany(
+                    'INSERT OR IGNORE INTO camera_engagement_rate (timestamp_, rate, camera_id) VALUES (?, ?, ?)',
+                    inserted,
+                    )
+                update_rollups(connection, inserted)
+        except sqlite3.OperationalError as e:
+            _logger.warning("Failed to write %d engagement rows, will retry: %s", len(batch), e)
+            self._retry_rows = batch[-self._max_retry_rows:]
+            dropped = len(batch) - len(self._retry_rows)
+            if dropped:
+                _logger.error("Retry backlog is full, dropping %d oldest engagement rows", dropped)
+                self._dropped_rows += dropped
+            return
+        except sqlite3.Error:
+            _logger.exception("Failed to write %d engagement rows, dropping them", len(batch))
+            self._dropped_rows += len(batch)
+            return
+        self._written_rows += len(inserted)
+        for listener in self._written_listeners:
+            try:
+                listener(inserted)
+            except Exception:
+                _logger.exception("Engagement rows listener failed")
+
+
+def _new_rows(connection, rows):
+    """Return rows of which no row with the same timestamp and camera is stored or comes earlier."""
+    timestamps_ms = [timestamp_ms for timestamp_ms, _, _ in rows]
+    # The primary key starts with the timestamp, so this reads the index only.
+    stored = connection.execute(
+        'SELECT timestamp_, camera_id FROM camera_engagement_rate WHERE timestamp_ BETWEEN ? AND ?',
+        (min(timestamps_ms), max(timestamps_ms)),
+        )
+    keys = {(timestamp_ms, camera_id) for timestamp_ms, camera_id in stored}
+    new_rows = []
+    for row in rows:
+        [timestamp_ms, _, camera_id] = row
+        if (timestamp_ms, camera_id) not in keys:
+            keys.add((timestamp_ms, camera_id))
+            new_rows.append(row)
+    return new_rows
+
+
+def _backfill_rollups(db):
+    """Build rollups for databases that were created before rollups existed."""
+    [has_rollups] = db.execute('SELECT EXISTS (SELECT 1 FROM camera_engagement_rollup)').fetchone()
+    [has_rates] = db.execute('SELECT EXISTS (SELECT 1 FROM camera_engagement_rate)').fetchone()
+    if has_rates and not has_rollups:
+        _logger.info("Building engagement rollups from existing engagement rates")
+        rebuild_rollups(db)
+
+
+def pragmas_from_config(config):
+    return {
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'cache_size': config['SQLITE_CACHE_SIZE'],
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT_MS'],
+        }
+
+
 def init_app(app):
+    database = app.config['DATABASE']
+    pragmas = pragmas_from_config(app.config)
+    max_idle = app.config['SQLITE_MAX_IDLE_CONNECTIONS']
+    app.config['DB_POOL'] = ConnectionPool(database, pragmas, max_idle=max_idle)
     app.teardown_appcontext(close_db)
+    app.cli.add_command(init_db_command)
     with app.app_context():
         init_db()
+        _backfill_rollups(get_db())
+    # Read-only connections can only be opened once the database file exists.
+    app.config['READ_DB_POOL'] = ConnectionPool(database, pragmas, read_only=True, max_idle=max_idle)
+    writer = EngagementRateWriter(
+        database,
+        pragmas,
+        max_batch_size=app.config['ENGAGEMENT_WRITER_MAX_BATCH_SIZE'],
+        max_latency_sec=app.config['ENGAGEMENT_WRITER_MAX_LATENCY_MS'] / 1000,
+        max_retry_rows=app.config['ENGAGEMENT_WRITER_MAX_RETRY_ROWS'],
+        )
+    app.config['ENGAGEMENT_RATE_WRITER'] = writer
+    writer.start()
+    atexit.register(writer.stop)
@@ -0,0 +1,120 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+from .common import format_uuid
+from .http.api.mediaserver import MediaserverApiConnectionError, MediaserverApiHttpError
+
+_logger = logging.getLogger(__name__)
+
+
+class DeviceInventory:
+    """Cameras of the Mediaserver and of the camera table, refreshed in the background.
+
+    Only the first read waits for the Mediaserver. Later reads get the last fetched
+    cameras at once, even when they are older than ttl_sec: a background thread
+    refreshes them every ttl_sec, give or take the jitter fraction, so that
+    workers started together don't query the Mediaserver in step. A read of
+    a stale inventory wakes the thread up. Cameras deleted from the Mediaserver
+    are kept, their archived data may still be needed. Only new and renamed
+    cameras are written to the camera table.
+    """
+
+    def __init__(self, db_pool, threshold_cache, ttl_sec: float = 60, jitter: float = 0.2):
+        self._db_pool = db_pool
+        self._threshold_cache = threshold_cache
+        self._ttl_sec = ttl_sec
+        self._jitter = jitter
+        self._cameras: Optional[dict[str, str]] = None
+        self._attempted_at = float('-inf')
+        self._mediaserver_api = None
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='DeviceInventory', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def get_cameras(self, mediaserver_api) -> Mapping[str, str]:
+        """Return camera names by id."""
+        self._mediaserver_api = mediaserver_api
+        cameras = self._cameras
+        if cameras is None:
+            with self._refresh_lock:
+                if self._cameras is None:
+                    self._refresh_locked(mediaserver_api)
+                cameras = self._cameras
+        elif time.monotonic() - self._attempted_at > self._ttl_sec:
+            self._wake.set()
+        return cameras
+
+    def refresh(self, mediaserver_api) -> int:
+        """Fetch the devices and upsert the changed cameras; return how many changed."""
+        with self._refresh_lock:
+            return self._refresh_locked(mediaserver_api)
+
+    def _refresh_locked(self, mediaserver_api) -> int:
+        self._attempted_at = time.monotonic()
+        fetched = {
+            format_uuid(device['id']): device['name']
+            for device in mediaserver_api.list_devices()
+            if device['deviceType'] == 'Camera'}
+        db = self._db_pool.acquire()
+        try:
+            if self._cameras is None:
+                known = {row['id']: row['name'] for row in db.execute('SELECT id, name FROM camera')}
+            else:
+                known = self._cameras
+            changed = [(id_, name) for id_, name in fetched.items() if known.get(id_) != name]
+            if changed:
+                # Unlike INSERT OR REPLACE, the upsert keeps thresholds and comments of the cameras.
+                with db:
+                    db.executemany(
+                        'INSERT INTO camera (id, name) VALUES (?, ?)'
+                        ' ON CONFLICT (id) DO UPDATE SET name = excluded.name',
+                        changed,
+                        )
+        finally:
+            self._db_pool.release(db)
+        # New cameras may be cached as unknown.
+        self._threshold_cache.invalidate(*(id_ for id_, _name in changed))
+        self._cameras = {**known, **fetched}
+        if changed:
+            _logger.info("Device inventory: %d cameras added or renamed", len(changed))
+        return len(changed)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self._ttl_sec * random.uniform(1 - self._jitter, 1 + self._jitter))
+            self._wake.clear()
+            mediaserver_api = self._mediaserver_api
+            if self._stopped.is_set() or mediaserver_api is None:
+                continue
+            try:
+                self.refresh(mediaserver_api)
+            except (MediaserverApiConnectionError, MediaserverApiHttpError) as e:
+                _logger.warning("Failed to refresh device inventory: %s", e)
+            except Exception:
+                _logger.exception("Failed to refresh device inventory")
+
+
+def init_app(app):
+    inventory = DeviceInventory(
+        app.config['DB_POOL'],
+        app.config['THRESHOLD_CACHE'],
+        ttl_sec=app.config['DEVICE_INVENTORY_TTL_SEC'],
+        jitter=app.config['DEVICE_INVENTORY_JITTER'],
+        )
+    inventory.start()
+    atexit.register(inventory.stop)
+    app.config['DEVICE_INVENTORY'] = inventory
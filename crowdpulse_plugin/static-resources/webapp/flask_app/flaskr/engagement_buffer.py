@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from typing import Iterable, NamedTuple, Optional
+
+
+class EngagementWindow(NamedTuple):
+    """Engagement rate of one camera over one closed flush window."""
+
+    start_ms: int
+    rate: float
+    camera_id: str
+    track_count: int
+
+
+class _CameraAccumulator:
+    """Running sums of track engagement for a single camera.
+
+    Memory is constant regardless of how many tracks a window receives.
+    The deadline is a time.monotonic() value after which the window is closed
+    even if no more tracks arrive. The latest closed windows are kept in recent.
+    Tracks of the camera have been received since covered_since_ms, the latest
+    one at time.monotonic() last_added_at.
+    """
+
+    __slots__ = (
+        'lock', 'start_ms', 'deadline', 'rate_sum', 'track_count', 'recent',
+        'covered_since_ms', 'last_added_at')
+
+    def __init__(self, recent_windows: int, covered_since_ms: int):
+        self.lock = threading.Lock()
+        self.start_ms: Optional[int] = None
+        self.deadline = 0.0
+        self.rate_sum = 0.0
+        self.track_count = 0
+        self.recent: deque[EngagementWindow] = deque(maxlen=recent_windows)
+        self.covered_since_ms = covered_since_ms
+        self.last_added_at = 0.0
+
+    def take_window(self, camera_id) -> Optional[EngagementWindow]:
+        if self.track_count == 0:
+            return None
+        window = EngagementWindow(
+            self.start_ms, self.rate_sum / self.track_count, camera_id, self.track_count)
+        self.recent.append(window)
+        self.start_ms = None
+        self.rate_sum = 0.0
+        self.track_count = 0
+        return window
+
+
+class EngagementBuffers:
+    """Per-camera engagement accumulators with independent flush windows.
+
+    Each camera has its own lock, so ingest for different cameras never contends;
+    the shared lock is only taken when a camera is seen for the first time.
+    The latest closed windows of each camera are kept in memory, so recent
+    engagement can be answered without the DB or the Mediaserver.
+    """
+
+    def __init__(
+            self,
+            flush_interval_ms: int = 2000,
+            recent_windows: int = 150,
+            max_idle_sec: float = 30,
+            ):
+        self.flush_interval_ms = flush_interval_ms
+        self._recent_windows = recent_windows
+        self._max_idle_sec = max_idle_sec
+        self._accumulators: dict[str, _CameraAccumulator] = {}
+        self._accumulators_lock = threading.Lock()
+
+    def add(
+            self,
+            timestamp_ms: int,
+            rate_sum: float,
+            camera_id: str,
+            track_count: int = 1,
+            ) -> Optional[EngagementWindow]:
+        """Account tracks and return the camera's window if they closed it.
+
+        Tracks seen at the same moment may be accounted at once by passing
+        the sum of their rates. Tracks that fall outside of the current window
+        close it and open the next one.
+        """
+        accumulator = self._get_accumulator(camera_id, timestamp_ms)
+        with accumulator.lock:
+            accumulator.last_added_at = time.monotonic()
+            closed_window = None
+            if accumulator.start_ms is not None:
+                if timestamp_ms - accumulator.start_ms >= self.flush_interval_ms:
+                    closed_window = accumulator.take_window(camera_id)
+            if accumulator.start_ms is None:
+                accumulator.start_ms = timestamp_ms
+                accumulator.deadline = time.monotonic() + self.flush_interval_ms / 1000
+            accumulator.rate_sum += rate_sum
+            accumulator.track_count += track_count
+        return closed_window
+
+    def close_expired(self, now: float) -> list[tuple[EngagementWindow, float]]:
+        """Close windows whose wall-clock deadline has passed.
+
+        Return pairs of the closed window and its deadline.
+        """
+        with self._accumulators_lock:
+            accumulators = list(self._accumulators.items())
+        expired = []
+        for camera_id, accumulator in accumulators:
+            with accumulator.lock:
+                if accumulator.start_ms is None or accumulator.deadline > now:
+                    continue
+                deadline = accumulator.deadline
+                window = accumulator.take_window(camera_id)
+            expired.append((window, deadline))
+        return expired
+
+    def drain(self) -> list[EngagementWindow]:
+        """Close and return all open windows, e.g. on shutdown."""
+        with self._accumulators_lock:
+            accumulators = list(self._accumulators.items())
+        windows = []
+        for camera_id, accumulator in accumulators:
+            with accumulator.lock:
+                window = accumulator.take_window(camera_id)
+            if window is not None:
+                windows.append(window)
+        return windows
+
+    def covers(self, camera_ids: Iterable[str], since_ms: int, now: float) -> bool:
+        """Tell whether tracks of the cameras since since_ms have been received here.
+
+        A camera is not covered if none of its tracks came for longer than max_idle_sec
+        before time.monotonic() now, e.g. because the plugin is not sending its metadata.
+        """
+        for camera_id in camera_ids:
+            accumulator = self._accumulators.get(camera_id)
+            if accumulator is None or since_ms < accumulator.covered_since_ms:
+                return False
+            if now - accumulator.last_added_at > self._max_idle_sec:
+                return False
+        return True
+
+    def summarize(
+            self,
+            camera_ids: Iterable[str],
+            since_ms: int,
+            until_ms: int,
+            now: float,
+            ) -> Optional[tuple[float, int]]:
+        """Return the rate sum and track count of the cameras' closed windows overlapping the range.
+
+        None means the range is not covered locally for some camera: it starts before
+        the first track of the camera this process received, is older than the kept
+        windows or the camera has been idle for longer than max_idle_sec.
+        """
+        camera_ids = list(camera_ids)
+        if not self.covers(camera_ids, since_ms, now):
+            return None
+        rate_sum = 0.0
+        track_count = 0
+        for camera_id in camera_ids:
+            accumulator = self._accumulators[camera_id]
+            with accumulator.lock:
+                recent = list(accumulator.recent)
+            if len(recent) == self._recent_windows and recent[0].start_ms > since_ms:
+                return None
+            for window in recent:
+                if window.start_ms < until_ms and window.start_ms + self.flush_interval_ms > since_ms:
+                    rate_sum += window.rate * window.track_count
+                    track_count += window.track_count
+        return rate_sum, track_count
+
+    def _get_accumulator(self, camera_id, timestamp_ms) -> _CameraAccumulator:
+        try:
+            return self._accumulators[camera_id]
+        except KeyError:
+            with self._accumulators_lock:
+                return self._accumulators.setdefault(
+                    camera_id, _CameraAccumulator(self._recent_windows, timestamp_ms))
+
+
+def init_app(app):
+    app.config['ENGAGEMENT_BUFFERS'] = EngagementBuffers(
+        flush_interval_ms=app.config['ENGAGEMENT_FLUSH_INTERVAL_MS'],
+        recent_windows=app.config['ENGAGEMENT_RECENT_WINDOWS'],
+        max_idle_sec=app.config['ENGAGEMENT_LOCAL_MAX_IDLE_SEC'],
+        )
@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Sequence
+
+from .engagement_buffer import EngagementBuffers, EngagementWindow
+
+_logger = logging.getLogger(__name__)
+
+
+class EngagementFlusher:
+    """Background thread that writes closed engagement windows off the request path.
+
+    Windows are closed either by ingest, when a track falls into the next window,
+    or by this thread once a window's wall-clock deadline has passed, so a camera
+    that goes quiet still gets its last window written.
+    """
+
+    def __init__(
+            self,
+            app,
+            buffers: EngagementBuffers,
+            flush_windows: Callable[[Sequence[EngagementWindow]], None],
+            tick_sec: float = 0.25,
+            ):
+        self._app = app
+        self._buffers = buffers
+        self._flush_windows = flush_windows
+        self._tick_sec = tick_sec
+        self._queue = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='EngagementFlusher', daemon=True)
+        self._stats_lock = threading.Lock()
+        self._last_lag_sec = 0.0
+        self._max_lag_sec = 0.0
+        self._flushed_windows = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write all windows that are still open."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        now = time.monotonic()
+        pending = self._take_submitted()
+        pending.extend((window, now) for window in self._buffers.drain())
+        self._flush(pending)
+
+    def submit(self, window: EngagementWindow):
+        self._queue.put((window, time.monotonic()))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'last_lag_ms': int(self._last_lag_sec * 1000),
+                'max_lag_ms': int(self._max_lag_sec * 1000),
+                'pending_windows': self._queue.qsize(),
+                'flushed_windows': self._flushed_windows,
+                }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            pending = []
+            try:
+                pending.append(self._queue.get(timeout=self._tick_sec))
+            except queue.Empty:
+                pass
+            pending.extend(self._take_submitted())
+            pending.extend(self._buffers.close_expired(time.monotonic()))
+            self._flush(pending)
+
+    def _take_submitted(self):
+        submitted = []
+        while True:
+            try:
+                submitted.append(self._queue.get_nowait())
+            except queue.Empty:
+                return submitted
+
+    def _flush(self, pending: Sequence[tuple[EngagementWindow, float]]):
+        if not pending:
+            return
+        windows = [window for window, _ in pending]
+        try:
+            with self._app.app_context():
+                self._flush_windows(windows)
+        except Exception:
+            _logger.exception("Failed to flush engagement windows: %s", windows)
+            return
+        flushed_at = time.monotonic()
+        lag_sec = max(flushed_at - closed_at for _, closed_at in pending)
+        with self._stats_lock:
+            self._last_lag_sec = lag_sec
+            self._max_lag_sec = max(self._max_lag_sec, lag_sec)
+            self._flushed_windows += len(windows)
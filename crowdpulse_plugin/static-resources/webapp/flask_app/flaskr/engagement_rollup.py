@@ -0,0 +1,129 @@
+import sqlite3
+from typing import Collection, Iterable, Mapping, Optional, Sequence
+
+# Bucket sizes of camera_engagement_rollup, finest first.
+ROLLUP_RESOLUTIONS_MS = (10_000, 60_000, 600_000, 3_600_000)
+
+_UPSERT_ROLLUP = (
+    'INSERT INTO camera_engagement_rollup'
+    ' (camera_id, resolution_ms, bucket_ms, count_, sum_, min_, max_)'
+    ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+    ' ON CONFLICT (camera_id, resolution_ms, bucket_ms) DO UPDATE SET'
+    '  count_ = count_ + excluded.count_,'
+    '  sum_ = sum_ + excluded.sum_,'
+    '  min_ = MIN(min_, excluded.min_),'
+    '  max_ = MAX(max_, excluded.max_)'
+    )
+
+
+def update_rollups(connection: sqlite3.Connection, rows: Iterable[tuple[int, float, str]]):
+    """Add (timestamp_ms, rate, camera_id) rows to the rollup buckets of every resolution.
+
+    Rows are aggregated in memory first, so a batch costs one upsert per touched bucket.
+    The caller is responsible for the transaction.
+    """
+    buckets = {}
+    for timestamp_ms, rate, camera_id in rows:
+        for resolution_ms in ROLLUP_RESOLUTIONS_MS:
+            key = (camera_id, resolution_ms, timestamp_ms - timestamp_ms % resolution_ms)
+            try:
+                [count, rate_sum, rate_min, rate_max] = buckets[key]
+            except KeyError:
+                buckets[key] = [1, rate, rate, rate]
+            else:
+                buckets[key] = [count + 1, rate_sum + rate, min(rate_min, rate), max(rate_max, rate)]
+    connection.executemany(
+        _UPSERT_ROLLUP, [(*key, *aggregates) for key, aggregates in buckets.items()])
+
+
+def rebuild_rollups(connection: sqlite3.Connection):
+    """Recompute all rollups from camera_engagement_rate."""
+    with connection:
+        connection.execute('DELETE FROM camera_engagement_rollup')
+        for resolution_ms in ROLLUP_RESOLUTIONS_MS:
+            connection.execute(
+                'INSERT INTO camera_engagement_rollup'
+                ' (camera_id, resolution_ms, bucket_ms, count_, sum_, min_, max_)'
+                ' SELECT camera_id, ?, timestamp_ - timestamp_ % ?, COUNT(*), SUM(rate), MIN(rate), MAX(rate)'
+                ' FROM camera_engagement_rate'
+                ' GROUP BY camera_id, timestamp_ - timestamp_ % ?',
+                (resolution_ms, resolution_ms, resolution_ms),
+                )
+
+
+def pick_resolution(
+        span_ms: Optional[int],
+        max_points: int,
+        raw_resolution_ms: int,
+        pruned: Collection[int] = (),
+        ) -> int:
+    """Choose the finest resolution that fits the span into max_points points.
+
+    The raw resolution is the engagement flush interval. Resolutions in pruned have
+    lost data of the span to retention and are only chosen if all of them have.
+    Spans too long even for the coarsest rollup get the coarsest one and are cut
+    to the latest points.
+    """
+    resolutions = [
+        resolution_ms for resolution_ms in (raw_resolution_ms, *ROLLUP_RESOLUTIONS_MS)
+        if resolution_ms >= raw_resolution_ms]
+    kept = [resolution_ms for resolution_ms in resolutions if resolution_ms not in pruned] or resolutions
+    if span_ms is None:
+        return kept[0]
+    for resolution_ms in kept:
+        if span_ms / resolution_ms <= max_points:
+            return resolution_ms
+    return kept[-1]
+
+
+def query_history(
+        db,
+        camera_id: str,
+        since_ms: Optional[int],
+        until_ms: int,
+        max_points: int,
+        raw_resolution_ms: int,
+        pruned_before_ms: Optional[Mapping[int, int]] = None,
+        ) -> tuple[int, Sequence[tuple[int, int, float, float, float]]]:
+    """Return the chosen resolution and (timestamp_ms, count, sum, min, max) rows, oldest first.
+
+    pruned_before_ms maps resolutions, the raw one included, to the time before
+    which retention deletes their data.
+    """
+    span_ms = None if since_ms is None else until_ms - since_ms
+    pruned = []
+    if since_ms is not None and pruned_before_ms is not None:
+        pruned = [resolution_ms for resolution_ms, cutoff_ms in pruned_before_ms.items() if since_ms < cutoff_ms]
+    resolution_ms = pick_resolution(span_ms, max_points, raw_resolution_ms, pruned)
+    if since_ms is None:
+        since_ms = 0
+    if resolution_ms not in ROLLUP_RESOLUTIONS_MS:
+        rows = db.execute(
+            'SELECT timestamp_, 1, rate, rate, rate'
+            ' FROM camera_engagement_rate'
+            ' WHERE camera_id = ? AND timestamp_ >= ? AND timestamp_ < ?'
+            ' ORDER BY timestamp_ DESC'
+            ' LIMIT ?',
+            (camera_id, since_ms, until_ms, max_points)).fetchall()
+    else:
+        rows = db.execute(
+            'SELECT bucket_ms, count_, sum_, min_, max_'
+            ' FROM camera_engagement_rollup'
+            ' WHERE camera_id = ? AND resolution_ms = ? AND bucket_ms >= ? AND bucket_ms < ?'
+            ' ORDER BY bucket_ms DESC'
+            ' LIMIT ?',
+            (camera_id, resolution_ms, since_ms - since_ms % resolution_ms, until_ms, max_points),
+            ).fetchall()
+    return resolution_ms, [tuple(row) for row in reversed(rows)]
+
+
+def query_bucket_starts(db, camera_id: str, since_ms: int, until_ms: int, resolution_ms: int) -> Sequence[int]:
+    """Return starts of the rollup buckets with engagement data in the range, oldest first."""
+    rows = db.execute(
+        'SELECT bucket_ms'
+        ' FROM camera_engagement_rollup'
+        ' WHERE camera_id = ? AND resolution_ms = ? AND bucket_ms >= ? AND bucket_ms < ?'
+        ' ORDER BY bucket_ms',
+        (camera_id, resolution_ms, since_ms - since_ms % resolution_ms, until_ms),
+        ).fetchall()
+    return [bucket_ms for [bucket_ms] in rows]
@@ -0,0 +1,89 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Iterator, Mapping, Optional
+
+
+class _Subscriber:
+
+    __slots__ = ('queue', 'overflowed')
+
+    def __init__(self, queue_size: int):
+        self.queue = queue.Queue(queue_size)
+        self.overflowed = False
+
+
+class EngagementStream:
+    """In-process pub/sub of per-camera engagement events, rendered as Server-Sent Events.
+
+    Recent events of each camera are kept, so a reconnecting client that sends
+    Last-Event-ID receives what it missed. A subscriber too slow to keep up is
+    disconnected and is expected to reconnect the same way.
+
+    Event ids continue after initial_event_id, by default the start time in
+    microseconds, so ids of a restarted app are greater than those of the
+    previous run and a client reconnecting with an old id misses nothing new.
+    """
+
+    def __init__(
+            self,
+            history_size: int = 100,
+            subscriber_queue_size: int = 100,
+            initial_event_id: Optional[int] = None,
+            ):
+        self._history_size = history_size
+        self._subscriber_queue_size = subscriber_queue_size
+        self._history: dict[str, deque[tuple[int, str]]] = {}
+        self._subscribers: dict[str, set[_Subscriber]] = {}
+        if initial_event_id is None:
+            initial_event_id = time.time_ns() // 1000
+        self._last_event_id = initial_event_id
+        self._lock = threading.Lock()
+
+    def publish(self, camera_id: str, event_type: str, data: Mapping[str, Any]):
+        with self._lock:
+            self._last_event_id += 1
+            message = f'id: {self._last_event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+            history = self._history.setdefault(camera_id, deque(maxlen=self._history_size))
+            history.append((self._last_event_id, message))
+            for subscriber in self._subscribers.get(camera_id, ()):
+                try:
+                    subscriber.queue.put_nowait(message)
+                except queue.Full:
+                    subscriber.overflowed = True
+
+    def events(
+            self,
+            camera_id: str,
+            last_event_id: Optional[int] = None,
+            heartbeat_sec: float = 15,
+            retry_ms: int = 3000,
+            ) -> Iterator[str]:
+        """Yield SSE messages for the camera until the client disconnects."""
+        subscriber = _Subscriber(self._subscriber_queue_size)
+        with self._lock:
+            if last_event_id is None:
+                missed = []
+            else:
+                missed = [
+                    message
+                    for event_id, message in self._history.get(camera_id, ())
+                    if event_id > last_event_id]
+            self._subscribers.setdefault(camera_id, set()).add(subscriber)
+        try:
+            yield f'retry: {retry_ms}\n\n'
+            yield from missed
+            while not subscriber.overflowed:
+                try:
+                    yield subscriber.queue.get(timeout=heartbeat_sec)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            with self._lock:
+                self._subscribers[camera_id].discard(subscriber)
+
+
+def init_app(app):
+    app.config['ENGAGEMENT_STREAM'] = EngagementStream()
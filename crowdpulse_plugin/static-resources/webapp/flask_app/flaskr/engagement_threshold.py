@@ -1,17 +1,25 @@
-from flask import Blueprint, request, jsonify, Response
+import threading
+from typing import Optional
+
+from flask import Blueprint, request, jsonify, Response, current_app, abort
 
 from .auth import login_required
-from .db import get_db
+from .caching import compress_response, conditional
+from .db import get_db, get_read_db
 
 bp = Blueprint('engagement_threshold', __name__, url_prefix='/engagement_threshold')
+bp.after_request(compress_response)
 
 
 @bp.route('/<string:camera_id>', methods=('GET', 'POST'), defaults={'unit': 'percent'})
 @login_required
+@conditional(lambda camera_id, unit: [('threshold', camera_id)])
 def process_engagement_threshold(camera_id, unit):
-    db = get_db()
+    threshold_cache = current_app.config['THRESHOLD_CACHE']
     if request.method == 'GET':
-        value = get_threshold_value_from_db(db, camera_id)
+        value = threshold_cache.get(get_read_db(), camera_id)
+        if value is None:
+            abort(404, f"Camera with ID {camera_id} not found.")
         if unit == 'percent':
             return_value = value * 100
         else:
@@ -25,13 +33,19 @@ def process_engagement_threshold(camera_id, unit):
         threshold = threshold / 100
     if not 0.0 <= threshold <= 1.0:
         return Response(status=422)
-    db.execute(
+    db = get_db()
+    cursor = db.execute(
         'UPDATE camera'
         ' SET threshold = COALESCE(?, threshold)'
         ' WHERE id = ?',
         (threshold, camera_id)
         )
     db.commit()
+    if cursor.rowcount > 0:
+        threshold_cache.set(camera_id, threshold)
+    else:
+        threshold_cache.invalidate(camera_id)
+    current_app.config['DATA_VERSIONS'].bump(('threshold', camera_id))
     return Response(status=200)
 
 
@@ -39,4 +53,46 @@ def get_threshold_value_from_db(db, camera_id):
     camera_row = db.execute(
         'SELECT threshold FROM camera WHERE id = ?',
         (camera_id,)).fetchone()
+    if camera_row is None:
+        return None
     return camera_row['threshold']
+
+
+class ThresholdCache:
+    """Process-wide camera thresholds, loaded lazily and updated on write.
+
+    Unknown cameras are cached as None; whoever inserts a camera row invalidates it.
+    """
+
+    def __init__(self):
+        self._thresholds: dict[str, Optional[float]] = {}
+        # Bumped on every write, so a value read from the DB before it is not cached.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, db, camera_id) -> Optional[float]:
+        try:
+            return self._thresholds[camera_id]
+        except KeyError:
+            pass
+        generation = self._generation
+        value = get_threshold_value_from_db(db, camera_id)
+        with self._lock:
+            if generation != self._generation:
+                return value
+            return self._thresholds.setdefault(camera_id, value)
+
+    def set(self, camera_id, value: float):
+        with self._lock:
+            self._generation += 1
+            self._thresholds[camera_id] = value
+
+    def invalidate(self, *camera_ids):
+        with self._lock:
+            self._generation += 1
+            for camera_id in camera_ids:
+                self._thresholds.pop(camera_id, None)
+
+
+def init_app(app):
+    app.config['THRESHOLD_CACHE'] = ThresholdCache()
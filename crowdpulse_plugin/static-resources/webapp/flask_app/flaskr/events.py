@@ -1,26 +1,43 @@
 import datetime
 import json
+import logging
 import random
 import threading
 import time
 import uuid
 from datetime import timedelta
-from typing import Mapping, Any
+from typing import Any, Iterable, Mapping
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, g, abort, current_app, jsonify
+from flask import (
+    Blueprint, render_template, request, flash, redirect, url_for, g, abort, current_app, jsonify, Response
+)
 
 from .auth import login_required
-from .common import format_uuid
-from .db import get_db
+from .caching import compress_response, conditional
+from .common import format_timestamp_ms, format_uuid
+from .db import get_db, get_read_db
+from .engagement_rollup import query_bucket_starts, query_history
 from .handle_metadata import calculate_average_engagement_rate
+from .http.api.mediaserver import Interval, IntervalSet
+from .retention import pruned_before_ms
+from .track_fetcher import FetchedTracks
+
+_logger = logging.getLogger(__name__)
 
 bp = Blueprint('events', __name__)  # TODO: Add /events url_prefix
+bp.after_request(compress_response)
+
+_DEFAULT_CAMERA_DATA_LIMIT = 50
+_MAX_CAMERA_DATA_LIMIT = 5000
+_MAX_TIMESTAMP_MS = 2 ** 63 - 1
+_DEFAULT_HISTORY_POINTS = 300
+_COVERAGE_RESOLUTION_MS = 60_000
 
 
 @bp.route('/')
 @login_required
 def index():
-    db = get_db()
+    db = get_read_db()
     events = db.execute(
         'SELECT e.id, start, finish, name, comment, username'
         ' FROM event e JOIN user u ON e.user_id = u.id'
@@ -38,7 +55,7 @@ def create():
         if mediaserver_api is None:
             flash("Mediaserver connection is required to update camera list. Please log in.")
             return redirect(url_for('auth.login'))
-        cameras = _get_all_cameras(mediaserver_api, db)
+        cameras = _get_all_cameras(mediaserver_api)
         return render_template('events/create.html', cameras=cameras)
     name = request.form['name']
     start = request.form['start']
@@ -65,6 +82,8 @@ def create():
     if cameras:
         _add_cameras_to_event(cameras, db, event_id)
     db.commit()
+    _invalidate_thresholds(cameras)
+    _on_cameras_replaced(cameras)
     return redirect(url_for('index'))
 
 
@@ -77,7 +96,7 @@ def update(id_):
         return redirect(url_for('auth.login'))
     event = _get_event(id_)
     db = get_db()
-    all_cameras = _get_all_cameras(mediaserver_api, db)
+    all_cameras = _get_all_cameras(mediaserver_api)
     previously_selected_cameras = _get_event_cameras_from_db(db, id_)
     if request.method == 'GET':
         return render_template(
@@ -109,6 +128,9 @@ def update(id_):
     _add_cameras_to_event(cameras_to_add, db, id_)
     _delete_cameras_from_event(cameras_to_delete, db, id_)
     db.commit()
+    _invalidate_thresholds(cameras_to_add)
+    current_app.config['DATA_VERSIONS'].bump(('event', id_))
+    _on_cameras_replaced(cameras_to_add)
     return redirect(url_for('index'))
 
 
@@ -120,6 +142,7 @@ def delete(id_):
     db.execute('DELETE FROM event WHERE id = ?', (id_,))
     db.execute('DELETE FROM event_cameras WHERE event_id = ?', (id_,))
     db.commit()
+    current_app.config['DATA_VERSIONS'].bump(('event', id_))
     return redirect(url_for('index'))
 
 
@@ -147,52 +170,171 @@ def get(id_):
 @bp.route('/<string:event_id>/analytics_tracks/<string:camera_id>', methods=('GET',))
 @login_required
 def get_analytics_tracks(event_id, camera_id):
+    """Stream tracks of the event cameras over the event, sorted by start.
+
+    The response is a JSON array, or NDJSON if format=ndjson is given or only
+    application/x-ndjson is accepted. Tracks are looked up a chunk of time at a time,
+    so memory use doesn't depend on the event length.
+    """
     mediaserver_api = current_app.config.get('MEDIASERVER_API')
     if mediaserver_api is None:
         flash("Mediaserver connection is required to update camera list. Please log in.")
         return redirect(url_for('auth.login'))
     db = get_db()
     event = _get_event(event_id)
-    start_ms = event['start'].timestamp() * 1000
-    finish_ms = event['finish'].timestamp() * 1000 if event['finish'] is not None else None
+    [start_ms, finish_ms] = _event_range_ms(event)
     all_event_cameras = _get_event_cameras_from_db(db, event_id)
     if camera_id is not None:
         if not camera_id in [camera.id for camera in all_event_cameras]:
             abort(404, f"Camera with ID {camera_id} not found among event {event['name']} cameras.")
         cameras = [camera for camera in all_event_cameras if camera.id == camera_id]
     else:
-        cameras = _get_event_cameras_from_db(db, event_id)
-    tracks = _get_analytics_tracks(mediaserver_api, start_ms, finish_ms, *cameras)
-    return [track.to_json() for track in tracks]
+        cameras = all_event_cameras
+    chunks = current_app.config['ANALYTICS_TRACK_FETCHER'].fetch_chunks(
+        mediaserver_api,
+        [camera.id for camera in cameras],
+        start_ms,
+        finish_ms,
+        chunk_ms=current_app.config['ANALYTICS_EXPORT_CHUNK_SEC'] * 1000,
+        )
+    mimetype = request.accept_mimetypes.best_match(('application/json', 'application/x-ndjson'))
+    if request.args.get('format') == 'ndjson' or mimetype == 'application/x-ndjson':
+        return Response(_stream_tracks(chunks, ndjson=True), mimetype='application/x-ndjson')
+    return Response(_stream_tracks(chunks, ndjson=False), mimetype='application/json')
+
+
+def _stream_tracks(chunks: Iterable[FetchedTracks], ndjson: bool, batch_size=256):
+    # Separate writes per track would cost a syscall each, so tracks go out in batches.
+    batch = [] if ndjson else ['[']
+    is_first = True
+    for fetched in chunks:
+        if fetched.failed_camera_ids:
+            # The status is sent already; a truncated response tells the client it's incomplete.
+            _logger.error(
+                "Analytics track streaming aborted, cameras failed: %s", ', '.join(fetched.failed_camera_ids))
+            return
+        for track in fetched.tracks:
+            serialized = json.dumps(track.as_dict())
+            if ndjson:
+                batch.append(serialized + '\n')
+            else:
+                batch.append(serialized if is_first else ',' + serialized)
+            is_first = False
+            if len(batch) >= batch_size:
+                yield ''.join(batch)
+                batch = []
+    if not ndjson:
+        batch.append(']')
+    if batch:
+        yield ''.join(batch)
+
+
+def _event_engagement_versions(event_id, camera_id, interval):
+    # Also checks that the event exists and belongs to the user before a 304 is given out.
+    _get_event(event_id)
+    buffers = current_app.config['ENGAGEMENT_BUFFERS']
+    # Only answers from local windows change with the versions, not Mediaserver ones.
+    since_ms = time.time() * 1000 - buffers.flush_interval_ms - interval * 1000
+    if camera_id is not None:
+        camera_ids = [camera_id]
+    else:
+        camera_ids = [camera.id for camera in _get_event_cameras_from_db(get_read_db(), event_id)]
+    if not buffers.covers(camera_ids, since_ms, time.monotonic()):
+        return None
+    # The range slides with time even if no window closes, e.g. on a camera nobody faces.
+    slot = ('slot', int(since_ms // buffers.flush_interval_ms))
+    return [('event', event_id), slot, *camera_ids]
 
 
 @bp.route('/<string:event_id>/engagement', defaults={'camera_id': None, 'interval': 2}, methods=('GET',))
 @bp.route('/<string:event_id>/engagement/<string:camera_id>', methods=('GET',), defaults={'interval': 2})
 @login_required
+@conditional(_event_engagement_versions)
 def get_engagement_level(event_id, camera_id, interval):
-    mediaserver_api = current_app.config.get('MEDIASERVER_API')
-    if mediaserver_api is None:
-        flash("Mediaserver connection is required to update camera list. Please log in.")
-        return redirect(url_for('auth.login'))
     db = get_db()
     event = _get_event(event_id)
-    finish = datetime.datetime.now()
-    start = finish - timedelta(seconds=interval)
-    start_timestamp = start.timestamp() * 1000
-    finish_timestamp = finish.timestamp() * 1000
     all_event_cameras = _get_event_cameras_from_db(db, event_id)
     if camera_id is not None:
         if not camera_id in [camera.id for camera in all_event_cameras]:
             abort(404, f"Camera with ID {camera_id} not found among event {event['name']} cameras.")
         cameras = [camera for camera in all_event_cameras if camera.id == camera_id]
     else:
-        cameras = _get_event_cameras_from_db(db, event_id)
-    tracks = _get_analytics_tracks(mediaserver_api, start_timestamp, finish_timestamp, *cameras)
-    score = calculate_average_engagement_rate(tracks)
+        cameras = all_event_cameras
+    buffers = current_app.config['ENGAGEMENT_BUFFERS']
+    # A window is closed a flush interval after it starts, so local data lags by that much.
+    finish_timestamp = time.time() * 1000 - buffers.flush_interval_ms
+    start_timestamp = finish_timestamp - interval * 1000
+    local_engagement = buffers.summarize(
+        [camera.id for camera in cameras], start_timestamp, finish_timestamp, time.monotonic())
+    if local_engagement is not None:
+        [rate_sum, track_count] = local_engagement
+        score = rate_sum / track_count if track_count else 0
+        headers = {}
+    else:
+        mediaserver_api = current_app.config.get('MEDIASERVER_API')
+        if mediaserver_api is None:
+            flash("Mediaserver connection is required to update camera list. Please log in.")
+            return redirect(url_for('auth.login'))
+        finish = datetime.datetime.now()
+        start = finish - timedelta(seconds=interval)
+        start_timestamp = start.timestamp() * 1000
+        finish_timestamp = finish.timestamp() * 1000
+        # Too recent to have settled, so the track cache passes the range to the Mediaserver as is.
+        fetched = _get_analytics_tracks(mediaserver_api, start_timestamp, finish_timestamp, *cameras)
+        if cameras and len(fetched.failed_camera_ids) == len(cameras):
+            abort(504, "Mediaserver didn't return analytics tracks of any event camera.")
+        score = calculate_average_engagement_rate(fetched.tracks)
+        headers = _failed_cameras_headers(fetched)
     return {
         'timestamp': finish_timestamp,
         'value': int(score * 100),  # In percents
-        }
+        }, headers
+
+
+@bp.route('/<string:event_id>/coverage', methods=('GET',))
+@login_required
+def get_coverage(event_id):
+    """Return periods of the event with recorded video and with analytics, per camera.
+
+    Periods are [start_ms, end_ms) pairs. Analytics periods are the minutes with
+    engagement data. Video periods come from the archive coverage index, they are
+    null for cameras whose archive isn't indexed.
+    """
+    event = _get_event(event_id)
+    event_interval = Interval(*_event_range_ms(event))
+    archive_coverage = current_app.config['ARCHIVE_COVERAGE']
+    db = get_read_db()
+    coverage = {}
+    for camera in _get_event_cameras_from_db(db, event_id):
+        bucket_starts = query_bucket_starts(db, camera.id, *event_interval, _COVERAGE_RESOLUTION_MS)
+        analytics = IntervalSet(
+            Interval(bucket_ms, bucket_ms + _COVERAGE_RESOLUTION_MS) for bucket_ms in bucket_starts)
+        analytics = IntervalSet(analytics.overlapping(event_interval))
+        if archive_coverage.has_camera(camera.id):
+            video = archive_coverage.recorded(camera.id, event_interval)
+            video_with_analytics = _interval_list(video.intersection(analytics))
+            video = _interval_list(video)
+        else:
+            video = video_with_analytics = None
+        coverage[camera.id] = {
+            'video': video,
+            'analytics': _interval_list(analytics),
+            'video_with_analytics': video_with_analytics,
+            }
+    return {'start_ms': event_interval.start_ms, 'end_ms': event_interval.end_ms, 'cameras': coverage}
+
+
+def _interval_list(intervals: IntervalSet):
+    return [list(interval) for interval in intervals]
+
+
+def _event_range_ms(event):
+    start_ms = int(event['start'].timestamp() * 1000)
+    if event['finish'] is not None:
+        finish_ms = int(event['finish'].timestamp() * 1000)
+    else:
+        finish_ms = int(time.time() * 1000)
+    return start_ms, finish_ms
 
 
 def _get_event(id_, check_author=True):
@@ -209,25 +351,89 @@ def _get_event(id_, check_author=True):
 
 
 @bp.route('/camera_data/<string:camera_id_>', methods=('GET',), defaults={'unit': 'percent'})
+@conditional(lambda camera_id_, unit: [camera_id_])
 def get_camera_data(camera_id_, unit):
-    max_count = 50  # TODO: Make customizable
-    db = get_db()
+    """Return the latest engagement points of the camera in chronological order.
+
+    Optional query parameters (milliseconds since epoch): since (inclusive) and
+    until (exclusive) bound the range; limit caps the number of points. To page
+    back in history, pass the timestamp_ms of the oldest returned point as until.
+    """
+    since_ms = request.args.get('since', default=0, type=int)
+    until_ms = request.args.get('until', default=_MAX_TIMESTAMP_MS, type=int)
+    limit = request.args.get('limit', default=_DEFAULT_CAMERA_DATA_LIMIT, type=int)
+    if not 0 < limit <= _MAX_CAMERA_DATA_LIMIT:
+        abort(400, f"limit must be between 1 and {_MAX_CAMERA_DATA_LIMIT}")
+    db = get_read_db()
     raw_result = db.execute(
         'SELECT timestamp_, rate'
         ' FROM camera_engagement_rate'
-        ' WHERE camera_id = ?',
-        (camera_id_,)).fetchall()
-    if len(raw_result) <= max_count:
-        pass
-    raw_result = raw_result[-max_count:]
+        ' WHERE camera_id = ? AND timestamp_ >= ? AND timestamp_ < ?'
+        ' ORDER BY timestamp_ DESC'
+        ' LIMIT ?',
+        (camera_id_, since_ms, until_ms, limit)).fetchall()
     result = []
-    for (timestamp_ms, rate) in raw_result:
+    for (timestamp_ms, rate) in reversed(raw_result):
         if unit == 'percent':
             rate *= 100
-        result.append({'timestamp': datetime.datetime.fromtimestamp(timestamp_ms / 1000), 'value': rate})
+        result.append({
+            'timestamp': format_timestamp_ms(timestamp_ms),
+            'timestamp_ms': timestamp_ms,
+            'value': rate,
+            })
     return jsonify(result)
 
 
+@bp.route('/camera_data/<string:camera_id_>/history', methods=('GET',), defaults={'unit': 'percent'})
+@conditional(lambda camera_id_, unit: [camera_id_])
+def get_camera_history(camera_id_, unit):
+    """Return engagement over a time range, at most points buckets.
+
+    Query parameters: since and until (milliseconds since epoch, until defaults
+    to now) and points. The finest resolution, raw windows or one of the rollups,
+    that fits the range into the requested number of points and still holds its
+    data after retention is used.
+    """
+    since_ms = request.args.get('since', type=int)
+    until_ms = request.args.get('until', default=int(time.time() * 1000), type=int)
+    max_points = request.args.get('points', default=_DEFAULT_HISTORY_POINTS, type=int)
+    if not 0 < max_points <= _MAX_CAMERA_DATA_LIMIT:
+        abort(400, f"points must be between 1 and {_MAX_CAMERA_DATA_LIMIT}")
+    resolution_ms, rows = query_history(
+        get_read_db(),
+        camera_id_,
+        since_ms,
+        until_ms,
+        max_points,
+        raw_resolution_ms=current_app.config['ENGAGEMENT_FLUSH_INTERVAL_MS'],
+        pruned_before_ms=pruned_before_ms(current_app.config, int(time.time() * 1000)),
+        )
+    scale = 100 if unit == 'percent' else 1
+    points = []
+    for (timestamp_ms, count, rate_sum, rate_min, rate_max) in rows:
+        points.append({
+            'timestamp': format_timestamp_ms(timestamp_ms),
+            'timestamp_ms': timestamp_ms,
+            'value': rate_sum / count * scale,
+            'min': rate_min * scale,
+            'max': rate_max * scale,
+            'count': count,
+            })
+    return jsonify({'resolution_ms': resolution_ms, 'points': points})
+
+
+@bp.route('/camera_data/<string:camera_id_>/stream', methods=('GET',))
+def stream_camera_data(camera_id_):
+    """Push new engagement points and threshold crossings of the camera as Server-Sent Events."""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    stream = current_app.config['ENGAGEMENT_STREAM']
+    return Response(
+        stream.events(camera_id_, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+
 class Camera:
 
     def __init__(self, raw: Mapping[str, Any]):
@@ -283,6 +489,15 @@ def _add_cameras_to_event(cameras, db, event_id):
         )
 
 
+def _invalidate_thresholds(cameras):
+    # INSERT OR REPLACE in _add_cameras_to_event() creates the cameras or resets their thresholds.
+    current_app.config['THRESHOLD_CACHE'].invalidate(*(camera.id for camera in cameras))
+
+
+def _on_cameras_replaced(cameras):
+    current_app.config['DATA_VERSIONS'].bump(*(('threshold', camera.id) for camera in cameras))
+
+
 def _delete_cameras_from_event(cameras, db, event_id):
     event_cameras_values = [str((event_id, camera.id)) for camera in cameras]
     event_cameras_values_str = ','.join(event_cameras_values)
@@ -292,32 +507,19 @@ def _delete_cameras_from_event(cameras, db, event_id):
         f' ({event_cameras_values_str});')
 
 
-def _get_all_cameras_from_db(db):
-    raw_selected_cameras = db.execute('SELECT * FROM camera').fetchall()
-    cameras = [Camera(data) for data in raw_selected_cameras]
-    return cameras
-
+def _get_all_cameras(mediaserver_api):
+    # It is possible that some cameras were removed from the Mediaserver. But we might need the archived data for them,
+    # so the inventory keeps the cameras of the camera table too.
+    cameras = current_app.config['DEVICE_INVENTORY'].get_cameras(mediaserver_api)
+    return {Camera({'id': id_, 'name': name}) for id_, name in cameras.items()}
 
-def _get_mediaserver_cameras(mediaserver_api):
-    raw_devices = mediaserver_api.list_devices()
-    cameras = [Camera(data) for data in raw_devices if data['deviceType'] == 'Camera']
-    return cameras
 
+def _get_analytics_tracks(mediaserver_api, start_ms, end_ms=None, *cameras: Camera) -> FetchedTracks:
+    fetcher = current_app.config['ANALYTICS_TRACK_FETCHER']
+    return fetcher.fetch(mediaserver_api, [camera.id for camera in cameras], start_ms, end_ms)
 
-def _get_all_cameras(mediaserver_api, db):
-    mediaserver_cameras = _get_mediaserver_cameras(mediaserver_api)
-    # It is possible that some cameras were removed from the Mediaserver. But we might need the archived data for them.
-    db_cameras = _get_all_cameras_from_db(db)
-    return set(mediaserver_cameras).union(set(db_cameras))
 
-
-def _get_analytics_tracks(mediaserver_api, start_ms, end_ms=None, *cameras: Camera):
-    all_tracks = []
-    params = {'start_time': start_ms}
-    if end_ms is not None:
-        params = {**params, 'end_time': end_ms}
-    for camera in cameras:
-        # TODO: Process camera non-existent case (e.g. deleted from Mediaserver)
-        tracks = mediaserver_api.list_analytics_objects_tracks(camera_id=camera.id, **params)
-        all_tracks = [*all_tracks, *tracks]
-    return all_tracks
+def _failed_cameras_headers(fetched: FetchedTracks):
+    if not fetched.failed_camera_ids:
+        return {}
+    return {'X-Failed-Cameras': ','.join(fetched.failed_camera_ids)}
@@ -1,13 +1,17 @@
+import atexit
+import json
 import logging
-from statistics import mean
-from typing import Collection, Mapping, Any
+from typing import Collection, Mapping, Any, Iterable, NamedTuple, Optional
 
-from flask import Blueprint, request, Response, current_app
+from flask import Blueprint, request, Response, current_app, jsonify
 
-from .common import format_uuid
-from .db import get_db
-from .engagement_threshold import get_threshold_value_from_db
+from .alert_dispatcher import AlertDispatcher
+from .common import format_timestamp_ms
+from .db import get_read_db
+from .engagement_buffer import EngagementWindow
+from .engagement_flusher import EngagementFlusher
 from .http.api.mediaserver import AnalyticsTrack
+from .metadata_decoder import DecodedTrack, decode_track, decode_track_dict
 
 _logger = logging.getLogger(__name__)
 
@@ -17,48 +21,125 @@ bp = Blueprint('handle_metadata', __name__, url_prefix='/metadata')
 
 @bp.route('/', methods=('POST',))
 def handle_metadata():
-    flush_interval_ms = 2000
-    buffer = current_app.config['TRACK_ENGAGEMENT_BUFFER']
-    plugin_metadata = request.json
+    plugin_metadata = request.get_data()
     _logger.debug("Got plugin metadata for track: %s", plugin_metadata)
-    track_engagement = process_plugin_metadata_track(plugin_metadata)
+    try:
+        track = decode_track(plugin_metadata)
+    except ValueError:
+        return Response(status=400)
+    track_engagement = process_decoded_track(track)
     _logger.debug("Calculated track_engagement: %s", track_engagement)
     if track_engagement is None:
         return Response(status=200)
-    current_app.config['TRACK_ENGAGEMENT_BUFFER'].append(track_engagement)
-    [first_track_timestamp_ms, _, _] = buffer[0]
-    [current_track_timestamp_ms, _, _] = track_engagement
-    if current_track_timestamp_ms - first_track_timestamp_ms >= flush_interval_ms:
-        engagement_per_camera = calculate_engagement(buffer)
-        db = get_db()
-        for record in engagement_per_camera:
-            db.execute(
-                'INSERT INTO camera_engagement_rate (timestamp_, rate, camera_id)'
-                ' VALUES (?, ?, ?)',
-                (first_track_timestamp_ms, *record),
-                )
-            [camera_engagement_rate, camera_id] = record
-            thresh_val = get_threshold_value_from_db(db, camera_id=camera_id)
-            if camera_engagement_rate < thresh_val:
-                plugin_api = current_app.config['PLUGIN_API']
-                plugin_api.send_analytics_event(
-                    type_='tigre.engagementBelowLevel',
-                    camera_id=camera_id,
-                    caption="ENGAGEMENT LEVEL DROP!",
-                    description=f"Engagement level on camera is below the threshold {thresh_val * 100:.1f}%",
-                    attributes={
-                        'camera_id': camera_id,
-                        'threshold': thresh_val,
-                        }
-                    )
-        db.commit()
-        current_app.config.from_mapping({'TRACK_ENGAGEMENT_BUFFER': []})
-        _logger.info(
-            "Recorded engagement stats to DB, (timestamp_ms, rate, camera_id): %s. "
-            "TRACK_ENGAGEMENT_BUFFER flushed.", engagement_per_camera)
+    _record_track_engagement(track_engagement)
     return Response(status=200)
 
 
+@bp.route('/batch', methods=('POST',))
+def handle_metadata_batch():
+    """Accept many tracks at once as a JSON array or newline-delimited JSON."""
+    tracks, rejected = decode_metadata_batch(request.get_data())
+    track_engagements = [process_decoded_track(track) for track in tracks]
+    for track_engagement in combine_track_engagements(track_engagements):
+        _record_track_engagement(track_engagement)
+    _logger.debug("Processed metadata batch: %d accepted, %d rejected", len(tracks), rejected)
+    return jsonify({'accepted': len(tracks), 'rejected': rejected})
+
+
+def decode_metadata_batch(body: bytes) -> tuple[list[DecodedTrack], int]:
+    """Decode a batch body, counting the tracks that failed to decode.
+
+    A body starting with '[' is treated as a JSON array, anything else as NDJSON.
+    """
+    body = body.strip()
+    if not body:
+        return [], 0
+    if body.startswith(b'['):
+        try:
+            raw_tracks = json.loads(body)
+        except ValueError:
+            return [], 1
+        if not isinstance(raw_tracks, list):
+            return [], 1
+        decode = decode_track_dict
+    else:
+        raw_tracks = [line for line in body.splitlines() if line.strip()]
+        decode = decode_track
+    tracks = []
+    rejected = 0
+    for raw_track in raw_tracks:
+        try:
+            tracks.append(decode(raw_track))
+        except ValueError:
+            _logger.debug("Rejected malformed plugin metadata track: %s", raw_track)
+            rejected += 1
+    return tracks, rejected
+
+
+@bp.route('/stats', methods=('GET',))
+def get_ingest_stats():
+    return jsonify({
+        **current_app.config['ENGAGEMENT_FLUSHER'].stats(),
+        **current_app.config['ENGAGEMENT_RATE_WRITER'].stats(),
+        })
+
+
+def _record_track_engagement(track_engagement):
+    buffers = current_app.config['ENGAGEMENT_BUFFERS']
+    window = buffers.add(*track_engagement)
+    if window is not None:
+        current_app.config['ENGAGEMENT_FLUSHER'].submit(window)
+
+
+def _flush_engagement_windows(windows: Collection[EngagementWindow]):
+    db = get_read_db()
+    threshold_cache = current_app.config['THRESHOLD_CACHE']
+    alert_dispatcher = current_app.config['ALERT_DISPATCHER']
+    writer = current_app.config['ENGAGEMENT_RATE_WRITER']
+    writer.write((window.start_ms, window.rate, window.camera_id) for window in windows)
+    stream = current_app.config['ENGAGEMENT_STREAM']
+    for window in windows:
+        stream.publish(window.camera_id, 'engagement', _engagement_event_data(window))
+        thresh_val = threshold_cache.get(db, window.camera_id)
+        if thresh_val is None:
+            continue
+        is_below = alert_dispatcher.report(window.camera_id, window.rate, thresh_val)
+        if is_below is not None:
+            stream.publish(window.camera_id, 'threshold', {
+                'timestamp_ms': window.start_ms,
+                'below': is_below,
+                'threshold': thresh_val * 100,
+                })
+    _logger.info("Queued engagement windows for DB: %s", windows)
+
+
+def _engagement_event_data(window: EngagementWindow):
+    # Same point format as /camera_data, in percent.
+    return {
+        'timestamp': format_timestamp_ms(window.start_ms),
+        'timestamp_ms': window.start_ms,
+        'value': window.rate * 100,
+        }
+
+
+def init_app(app):
+    alert_dispatcher = AlertDispatcher(
+        app, hysteresis=app.config['ENGAGEMENT_ALERT_HYSTERESIS'])
+    app.config['ALERT_DISPATCHER'] = alert_dispatcher
+    alert_dispatcher.start()
+    flusher = EngagementFlusher(
+        app,
+        app.config['ENGAGEMENT_BUFFERS'],
+        _flush_engagement_windows,
+        tick_sec=app.config['ENGAGEMENT_FLUSHER_TICK_MS'] / 1000,
+        )
+    app.config['ENGAGEMENT_FLUSHER'] = flusher
+    flusher.start()
+    # Registered last to run first: the flusher's final windows still reach the dispatcher.
+    atexit.register(alert_dispatcher.stop)
+    atexit.register(flusher.stop)
+
+
 class TrackTypeIds:
 
     ATTENTIVE = 'nx.nxai.Attentive'
@@ -67,45 +148,70 @@ class TrackTypeIds:
 
 def calculate_average_engagement_rate(tracks: Collection[AnalyticsTrack]) -> float:
     # TODO: Improve heuristics
-    if len(tracks) == 0:
+    # Like ingest, only attentive and distracted objects count, so both agree on the same tracks.
+    type_ids = [t.type_id() for t in tracks]
+    attentive_count = type_ids.count(TrackTypeIds.ATTENTIVE)
+    object_count = attentive_count + type_ids.count(TrackTypeIds.DISTRACTED)
+    if object_count == 0:
         return 0
-    attentive_tracks = [t for t in tracks if t.type_id == TrackTypeIds.ATTENTIVE]
-    score = float(len(attentive_tracks)) / len(tracks)
+    score = float(attentive_count) / object_count
     return score
 
 
-class _MetadataTrack:
-    def __init__(self, raw_track: Mapping[str, Any]):
-        self._raw_track = raw_track
+def process_plugin_metadata_track(raw_track: Mapping[str, Any]):
+    return process_decoded_track(decode_track_dict(raw_track))
 
-    def camera_id(self):
-        return format_uuid(self._raw_track['deviceId'])
 
-    def timestamp_us(self):
-        return int(self._raw_track['timestampUs'])
+class TrackEngagement(NamedTuple):
+    """Attentive objects among the engagement-relevant objects of a camera at a moment."""
 
-    def type_id(self):
-        return self._raw_track['objectMetadataList'][0]['typeId']
+    timestamp_ms: int
+    attentive_count: int
+    camera_id: str
+    object_count: int
 
 
-def process_plugin_metadata_track(raw_track):
-    track = _MetadataTrack(raw_track)
-    type_id = track.type_id()
-    if type_id not in (TrackTypeIds.ATTENTIVE, TrackTypeIds.DISTRACTED):
+def process_decoded_track(track: DecodedTrack) -> Optional[TrackEngagement]:
+    # tuple.count() scans in C, so crowded packets cost no per-object Python code.
+    attentive_count = track.type_ids.count(TrackTypeIds.ATTENTIVE)
+    object_count = attentive_count + track.type_ids.count(TrackTypeIds.DISTRACTED)
+    if object_count == 0:
         return None
-    rate = 1.0 if track.type_id() == TrackTypeIds.ATTENTIVE else 0.0
-    timestamp_ms = track.timestamp_us() // 1000
-    camera_id = track.camera_id()
-    return timestamp_ms, rate, camera_id
+    return TrackEngagement(track.timestamp_us // 1000, attentive_count, track.camera_id, object_count)
+
+
+def combine_track_engagements(
+        track_engagements: Iterable[Optional[TrackEngagement]]) -> list[TrackEngagement]:
+    """Merge consecutive engagements of the same camera at the same moment.
+
+    Plugin packets of one frame share a timestamp, so a batch usually collapses
+    to a single engagement per camera and frame.
+    """
+    combined = []
+    for track_engagement in track_engagements:
+        if track_engagement is None:
+            continue
+        if combined:
+            last = combined[-1]
+            if last.timestamp_ms == track_engagement.timestamp_ms and last.camera_id == track_engagement.camera_id:
+                combined[-1] = last._replace(
+                    attentive_count=last.attentive_count + track_engagement.attentive_count,
+                    object_count=last.object_count + track_engagement.object_count,
+                    )
+                continue
+        combined.append(track_engagement)
+    return combined
 
 
-def calculate_engagement(track_engagement_rates):
-    raw_result = {}
-    for engagement_data in track_engagement_rates:
+def calculate_engagement(track_engagements):
+    sums_and_counts = {}
+    for engagement_data in track_engagements:
         if engagement_data is None:
             continue
-        (timestamp_ms, rate, camera_id) = engagement_data
-        camera_rates = raw_result.setdefault(camera_id, [])
-        camera_rates.append(rate)
-    engagement_rates = [(mean(rates), camera_id) for camera_id, rates in raw_result.items()]
+        (timestamp_ms, attentive_count, camera_id, object_count) = engagement_data
+        [attentive_sum, object_sum] = sums_and_counts.get(camera_id, (0, 0))
+        sums_and_counts[camera_id] = (attentive_sum + attentive_count, object_sum + object_count)
+    engagement_rates = [
+        (attentive_sum / object_sum, camera_id)
+        for camera_id, (attentive_sum, object_sum) in sums_and_counts.items()]
     return engagement_rates
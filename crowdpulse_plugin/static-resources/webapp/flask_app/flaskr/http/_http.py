@@ -1,15 +1,22 @@
+import atexit
+import codecs
+import functools
 import json
+import select
 import ssl
+import threading
+import time
 import urllib.parse
 import urllib.request
 from abc import ABCMeta
 from abc import abstractmethod
-from contextlib import closing
-from http.client import HTTPResponse as BaseHttpResponse, HTTPConnection
+from contextlib import contextmanager
+from http.client import HTTPResponse as BaseHttpResponse, HTTPConnection, IncompleteRead
 from http.client import HTTPSConnection as BaseHttpsConnection
 from sqlite3 import connect
-from typing import Any, Protocol
+from typing import Any, NamedTuple, Protocol
 from typing import Iterable
+from typing import Iterator
 from typing import Mapping
 from typing import Optional
 from typing import Union
@@ -26,7 +33,13 @@ def http_request(
         timeout: float = DEFAULT_HTTP_TIMEOUT,
         auth_handler: Optional['AuthHandler'] = None,
         ssl_enabled: bool = True,
+        stream: bool = False,
         ) -> 'HttpResponse':
+    """Send a request over a kept-alive connection.
+
+    With stream, the body of a 200 response is left on the socket and read on
+    demand; the connection is not reused then.
+    """
     if timeout is None:
         raise RuntimeError("Timeout must not be None; otherwise a request may be endless")
     if headers is None:
@@ -34,34 +47,157 @@ def http_request(
     headers = {'Connection': 'Keep-Alive', **headers}
     request = _HttpRequest(method, url, content, headers)
     parsed_url = urllib.parse.urlparse(url)
-
-    with closing(
-            _https_connection(
-                hostname=parsed_url.hostname,
-                port=parsed_url.port,
-                auth_handler=auth_handler,
-                timeout=timeout) if ssl_enabled else
-            _http_connection(
-                hostname=parsed_url.hostname,
-                port=parsed_url.port,
-                timeout=timeout,
-                )
-            ) as connection:
+    key = _ConnectionKey(ssl_enabled, parsed_url.hostname, parsed_url.port)
+    if not ssl_enabled:
+        auth_handler = None
+    if auth_handler is not None:
         try:
-            return connection.send_request(request)
-        except (ConnectionError, ssl.SSLEOFError, ssl.SSLZeroReturnError):
-            raise HttpConnectionError()
-        except TimeoutError:
-            raise HttpReadTimeout()
-
-
-def _https_connection(hostname, port, auth_handler, timeout):
+            auth_handler.authorize_request(request)
+        except _CannotAuthorizeRequest:
+            pass
+    response = _send_request(key, request, timeout, stream)
+    if response.status_code in (401, 403) and auth_handler is not None:
+        try:
+            auth_handler.handle_failed_request(request, response)
+        except CannotHandleRequest:
+            return response
+        response = _send_request(key, request, timeout, stream)
+    return response
+
+
+# Retrying these is safe even if the server got the request before the connection broke.
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+
+def _send_request(key: '_ConnectionKey', request: '_HttpRequest', timeout: float, stream: bool) -> 'HttpResponse':
+    [connection, is_reused] = _connection_pool.acquire(key, timeout)
+    try:
+        response = _send_over(connection, request, stream)
+    except HttpConnectionError:
+        if not is_reused or request.method not in _IDEMPOTENT_METHODS:
+            raise
+        # The server closed the kept-alive connection in the meantime: try once on a new one.
+        connection = _connection_pool.connect(key, timeout)
+        response = _send_over(connection, request, stream)
+    if not response.is_streamed:
+        _connection_pool.release(key, connection, response)
+    return response
+
+
+def _send_over(connection, request: '_HttpRequest', stream: bool) -> 'HttpResponse':
+    try:
+        return connection.send_request(request, stream)
+    except (ConnectionError, ssl.SSLEOFError, ssl.SSLZeroReturnError):
+        connection.close()
+        raise HttpConnectionError()
+    except TimeoutError:
+        connection.close()
+        raise HttpReadTimeout()
+    except BaseException:
+        connection.close()
+        raise
+
+
+class _ConnectionKey(NamedTuple):
+    ssl_enabled: bool
+    hostname: str
+    port: Optional[int]
+
+
+class _IdleConnection(NamedTuple):
+    connection: Union['_HTTPConnection', '_HttpsConnection']
+    idle_since: float
+
+
+class _ConnectionPool:
+    """Kept-alive connections, per host, waiting to be reused.
+
+    A connection is taken out of the pool for the time of a request, so it is never
+    shared between threads. Connections idle for longer than idle_timeout_sec, or
+    that the server has closed or sent something unexpected on, are dropped.
+    At most max_idle_per_host connections per host are kept.
+    """
+
+    def __init__(self, max_idle_per_host: int = 8, idle_timeout_sec: float = 30):
+        self._max_idle_per_host = max_idle_per_host
+        self._idle_timeout_sec = idle_timeout_sec
+        self._idle: dict[_ConnectionKey, list[_IdleConnection]] = {}
+        self._ssl_sessions: dict[_ConnectionKey, ssl.SSLSession] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: _ConnectionKey, timeout: float):
+        """Return a connection and whether it was used before."""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                [connection, idle_since] = idle.pop()
+            if now - idle_since < self._idle_timeout_sec and not _is_stale(connection):
+                connection.timeout = timeout
+                connection.sock.settimeout(timeout)
+                return connection, True
+            connection.close()
+        return self.connect(key, timeout), False
+
+    def connect(self, key: _ConnectionKey, timeout: float):
+        if not key.ssl_enabled:
+            return _http_connection(key.hostname, key.port, timeout)
+        with self._lock:
+            ssl_session = self._ssl_sessions.get(key)
+        return _https_connection(key.hostname, key.port, timeout, ssl_session)
+
+    def release(self, key: _ConnectionKey, connection, response: 'HttpResponse'):
+        if response.will_close or connection.sock is None:
+            connection.close()
+            return
+        ssl_session = getattr(connection.sock, 'session', None)
+        with self._lock:
+            if ssl_session is not None:
+                self._ssl_sessions[key] = ssl_session
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_idle_per_host:
+                idle.append(_IdleConnection(connection, time.monotonic()))
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle = [c for connections in self._idle.values() for c in connections]
+            self._idle.clear()
+        for connection, _ in idle:
+            connection.close()
+
+
+def _is_stale(connection) -> bool:
+    # An idle connection must have nothing to read: EOF or data mean it can't be reused.
+    if connection.sock is None:
+        return True
+    try:
+        [readable, _, _] = select.select([connection.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+_connection_pool = _ConnectionPool()
+atexit.register(_connection_pool.close)
+
+
+@functools.lru_cache(maxsize=None)
+def _ssl_context():
+    # Out of the box Mediaserver has got a self-signed SSL certificate.
+    return ssl._create_unverified_context()
+
+
+def _https_connection(hostname, port, timeout, ssl_session=None):
     return _HttpsConnection(
         hostname,
         port,
-        ssl._create_unverified_context(),  # Out of the box Mediaserver has got a self-signed SSL certificate.
-        auth_handler,
+        _ssl_context(),
         timeout=timeout,
+        ssl_session=ssl_session,
         )
 
 
@@ -100,19 +236,150 @@ class _HttpRequest:
         self.content = content
 
 
+@contextmanager
+def _translated_read_errors():
+    try:
+        yield
+    except TimeoutError:
+        raise HttpReadTimeout()
+    except (ConnectionError, IncompleteRead, ssl.SSLError):
+        raise HttpConnectionError()
+
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+_JSON_WHITESPACE = ' \t\r\n'
+_NOT_DECODED = object()
+
+
 class HttpResponse:
+    """Status and headers of a response; the body is decoded as JSON on first access.
 
-    def __init__(self, response: BaseHttpResponse, request_method: str, url: str):
+    If a connection is given, the body of a 200 response is left on it, to be read
+    either whole, through content or json, or element by element, through
+    iter_json_array(). The connection is closed once the body is read or
+    the response is closed.
+    """
+
+    def __init__(self, response: BaseHttpResponse, request_method: str, url: str, connection=None):
         self.status_code: int = response.status
         self.reason: str = response.reason
         self.headers = response.headers
         self.request_method = request_method
         self.url = url
-        self.content = response.read()
+        self.will_close = response.will_close
+        self._json = _NOT_DECODED
+        if connection is not None and self.status_code == 200:
+            self._response = response
+            self._connection = connection
+            self._content = None
+            self._prefix = b''
+        else:
+            self._connection = None
+            self._content = response.read()
+
+    @property
+    def is_streamed(self) -> bool:
+        return self._connection is not None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            try:
+                with _translated_read_errors():
+                    self._content = self._prefix + self._response.read()
+            finally:
+                self.close()
+        return self._content
+
+    @property
+    def json(self):
+        if self._json is _NOT_DECODED:
+            try:
+                self._json = json.loads(self.content.decode('utf-8'))
+            except ValueError:
+                self._json = None
+        return self._json
+
+    def starts_json_array(self) -> bool:
+        """Whether the body is a JSON array, reading only up to its first character."""
+        if self._content is not None:
+            return self._content.lstrip()[:1] == b'['
+        while not self._prefix.strip():
+            with _translated_read_errors():
+                chunk = self._response.read1(_STREAM_CHUNK_SIZE)
+            if not chunk:
+                return False
+            self._prefix += chunk
+        return self._prefix.lstrip()[:1] == b'['
+
+    def iter_json_array(self, chunk_size: int = _STREAM_CHUNK_SIZE) -> Iterator[Any]:
+        """Yield elements of a JSON array body, decoding them as they arrive.
+
+        Only the element being decoded and one chunk are buffered. Reading the body
+        whole afterwards is not possible.
+        """
+        if self._content is not None:
+            yield from self.json
+            return
         try:
-            self.json = json.loads(self.content.decode('utf-8'))
-        except ValueError:
-            self.json = None
+            with _translated_read_errors():
+                yield from _iter_json_array(self._prefix, self._response, chunk_size)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._connection is not None:
+            self._response.close()
+            self._connection.close()
+            self._connection = None
+            if self._content is None:
+                self._content = b''
+
+
+def _iter_json_array(prefix: bytes, response: BaseHttpResponse, chunk_size: int) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = text_decoder.decode(prefix)
+    position = 0
+    read_size = chunk_size
+    is_eof = False
+    is_started = False
+    while True:
+        while position < len(buffer) and buffer[position] in _JSON_WHITESPACE:
+            position += 1
+        if position < len(buffer):
+            char = buffer[position]
+            if not is_started:
+                if char != '[':
+                    raise ValueError(f"JSON array expected, got {char!r}")
+                is_started = True
+                position += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                position += 1
+                continue
+            try:
+                [element, end] = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if is_eof:
+                    raise
+            else:
+                # A number at the end of the buffer may continue in the next chunk.
+                if end < len(buffer) or is_eof:
+                    yield element
+                    position = end
+                    read_size = chunk_size
+                    continue
+            # An element spans chunks: read more at a time to not re-decode it too often.
+            read_size *= 2
+        elif is_eof:
+            raise ValueError("JSON array is truncated")
+        chunk = response.read1(read_size)
+        is_eof = not chunk
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=is_eof)
+        position = 0
 
 
 class AuthHandler(metaclass=ABCMeta):
@@ -206,9 +473,10 @@ class _HTTPConnection(HTTPConnection):
     def __init__(self, host, port, timeout):
         super().__init__(host, port, timeout)
 
-    def send_request(self, request: '_HttpRequest') -> 'HttpResponse':
+    def send_request(self, request: '_HttpRequest', stream: bool = False) -> 'HttpResponse':
         super().request(request.method, request.url, request.content, request.headers)
-        response = HttpResponse(super().getresponse(), request.method, request.url)
+        response = HttpResponse(
+            super().getresponse(), request.method, request.url, connection=self if stream else None)
         return response
 
 
@@ -219,27 +487,23 @@ class _HttpsConnection(BaseHttpsConnection):
             host: str,
             port: int,
             ssl_context: ssl.SSLContext,
-            auth_handler: Optional['AuthHandler'] = None,
             timeout: Optional[float] = None,
+            ssl_session: Optional[ssl.SSLSession] = None,
             ):
         super().__init__(host, port, timeout=timeout, context=ssl_context)
-        self._auth_handler = auth_handler
+        self._ssl_context = ssl_context
+        self._ssl_session = ssl_session
 
-    def send_request(self, request: _HttpRequest) -> HttpResponse:
-        if self._auth_handler is not None:
-            try:
-                self._auth_handler.authorize_request(request)
-            except _CannotAuthorizeRequest:
-                pass
+    def connect(self):
+        # Same as the base class, but resumes the TLS session of an earlier connection to the host.
+        HTTPConnection.connect(self)
+        self.sock = self._ssl_context.wrap_socket(
+            self.sock, server_hostname=self.host, session=self._ssl_session)
+
+    def send_request(self, request: _HttpRequest, stream: bool = False) -> HttpResponse:
         super().request(request.method, request.url, request.content, request.headers)
-        response = HttpResponse(super().getresponse(), request.method, request.url)
-        if response.status_code in (401, 403) and self._auth_handler is not None:
-            try:
-                self._auth_handler.handle_failed_request(request, response)
-            except CannotHandleRequest:
-                return response
-            super().request(request.method, request.url, request.content, request.headers)
-            response = HttpResponse(super().getresponse(), request.method, request.url)
+        response = HttpResponse(
+            super().getresponse(), request.method, request.url, connection=self if stream else None)
         return response
 
 
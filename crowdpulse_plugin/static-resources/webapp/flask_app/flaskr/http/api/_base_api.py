@@ -32,29 +32,55 @@ class BaseApi(metaclass=ABCMeta):
         pass
 
     def http_get(self, path, params=None, with_credentials=True, **kwargs):
+        self._log_get(path, params, with_credentials)
+        assert 'data' not in kwargs
+        assert 'json' not in kwargs
+        return self._http_request('GET', path, params=params, **kwargs)
+
+    def _log_get(self, path, params, with_credentials):
+        if not _logger.isEnabledFor(logging.DEBUG):
+            return
         params_str = pformat(params, indent=4)
         if '\n' in params_str or len(params_str) > 60:
             params_str = '\n' + params_str
         _logger.debug(
             'GET %s, params: %s',
             self.http_url(path, with_credentials), params_str)
-        assert 'data' not in kwargs
-        assert 'json' not in kwargs
-        return self._http_request('GET', path, params=params, **kwargs)
 
     def http_post(self, path, data, timeout: float = DEFAULT_HTTP_TIMEOUT, **kwargs):
         return self._make_json_request('POST', path, data, timeout, **kwargs)
 
     def _make_json_request(self, method, path, data, timeout, with_credentials=False, **kwargs):
+        self._log_json_request(method, path, data, timeout, with_credentials)
+        return self._http_request(method, path, json=data, timeout=timeout, **kwargs)
+
+    def _log_json_request(self, method, path, data, timeout, with_credentials):
+        if not _logger.isEnabledFor(logging.DEBUG):
+            return
         data_str = json.dumps(data)
         if len(data_str) > 60:
             data_str = '\n' + json.dumps(data, indent=4)
         _logger.debug(
             '%s %s, timeout: %s sec, payload:\n%s',
             method, self.http_url(path, with_credentials=with_credentials), timeout, data_str)
-        return self._http_request(method, path, json=data, timeout=timeout, **kwargs)
 
-    def _request(self, method: str, path: str, ssl_enabled=True, params=None, **kwargs):
+    def _request(self, method: str, path: str, ssl_enabled=True, params=None, stream=False, **kwargs):
+        [url, content] = self._url_and_content(path, params, kwargs)
+        started_at = time.perf_counter()
+        response = http_request(
+            method,
+            url,
+            content,
+            headers=kwargs.get('headers', {}),
+            timeout=kwargs.get('timeout', DEFAULT_HTTP_TIMEOUT),
+            auth_handler=self.auth_handler,
+            ssl_enabled=ssl_enabled,
+            stream=stream,
+        )
+        self._log_response(method, url, path, started_at, response)
+        return response
+
+    def _url_and_content(self, path, params, kwargs):
         if params:
             # Server, which uses QUrlQuery doesn't support spaces, encoded as "+".
             # See https://doc.qt.io/qt-5/qurlquery.html#handling-of-spaces-and-plus.
@@ -66,17 +92,12 @@ class BaseApi(metaclass=ABCMeta):
             content = kwargs['data']
         else:
             content = None
-        headers = kwargs.get('headers', {})
-        started_at = time.perf_counter()
-        url = self.http_url(path, with_credentials=False)
-        response = http_request(
-            method,
-            url,
-            content,
-            headers=headers,
-            auth_handler=self.auth_handler,
-            ssl_enabled=ssl_enabled,
-        )
+        return self.http_url(path, with_credentials=False), content
+
+    @staticmethod
+    def _log_response(method, url, path, started_at, response):
+        if not _logger.isEnabledFor(logging.INFO):
+            return
         _logger.info(
             "HTTP API %(method)s %(url)s, "
             "took %(duration).3f sec, "
@@ -88,7 +109,6 @@ class BaseApi(metaclass=ABCMeta):
                 'duration': time.perf_counter() - started_at,
                 'status': response.status_code,
             })
-        return response
 
     def _retrieve_data(self, response, response_json):
         if not response.content:
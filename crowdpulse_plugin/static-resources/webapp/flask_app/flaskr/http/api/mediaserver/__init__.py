@@ -1,11 +1,15 @@
-from ._analytics import AnalyticsTrack
+from ._analytics import AnalyticsTrack, TimePeriod
 from ._api import MediaserverApiV3
+from ._intervals import Interval, IntervalSet
 from ._mediaserver_http_exceptions import MediaserverApiConnectionError, MediaserverApiHttpError, NotFound
 
 __all__ = [
     'AnalyticsTrack',
+    'Interval',
+    'IntervalSet',
     'MediaserverApiV3',
     'MediaserverApiConnectionError',
     'MediaserverApiHttpError',
     'NotFound',
+    'TimePeriod',
     ]
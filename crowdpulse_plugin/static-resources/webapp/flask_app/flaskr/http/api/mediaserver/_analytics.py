@@ -1,66 +1,148 @@
 import json
 import logging
 import os
+import sys
+from array import array
 from collections.abc import Mapping
 from datetime import datetime, timezone, timedelta
 from math import isclose
 from typing import Optional, Sequence
 
+from ._intervals import Interval, IntervalSet
 from ....common import format_uuid
 
 _logger = logging.getLogger(__name__)
 
 
 class AnalyticsTrack:
+    """A track of the analytics lookup, parsed once.
+
+    Times are kept as integer microseconds, as the Mediaserver sends them. Positions
+    are decoded on first access into contiguous arrays; until then, the raw
+    position list is kept as is.
+    """
+
+    __slots__ = (
+        '_track_id', '_type_id', 'start_us', 'end_us', '_attributes',
+        '_raw_positions', '_timestamps_us', '_coordinates')
 
     def __init__(self, raw_track: Mapping):
-        self._raw_track = raw_track
+        self._track_id = format_uuid(raw_track['id'])
+        # Tracks share a handful of object types.
+        self._type_id = sys.intern(raw_track['objectTypeId'])
+        self.start_us = int(raw_track['firstAppearanceTimeUs'])
+        self.end_us = int(raw_track['lastAppearanceTimeUs'])
+        self._attributes = raw_track.get('attributes', [])
+        self._raw_positions = raw_track.get('objectPositionSequence')
+        self._timestamps_us = None
+        self._coordinates = None
+
+    @property
+    def start_ms(self) -> int:
+        return self.start_us // 1000
+
+    @property
+    def end_ms(self) -> int:
+        return self.end_us // 1000
 
     def track_id(self):
-        return format_uuid(self._raw_track['id'])
+        return self._track_id
 
     def type_id(self):
-        return self._raw_track['objectTypeId']
+        return self._type_id
 
     def time_period(self):
-        start_ms = int(self._raw_track['firstAppearanceTimeUs']) // 1000
-        end_ms = int(self._raw_track['lastAppearanceTimeUs']) // 1000
-        return TimePeriod.from_start_and_end_ms(start_ms=start_ms, end_ms=end_ms)
+        return TimePeriod.from_start_and_end_ms(start_ms=self.start_ms, end_ms=self.end_ms)
 
     def attributes(self):
-        return self._raw_track['attributes']
+        return self._attributes
+
+    def raw(self) -> Mapping:
+        raw_track = self.as_dict()
+        if self._raw_positions is not None or self._coordinates is not None:
+            raw_track['objectPositionSequence'] = self._raw_position_sequence()
+        return raw_track
+
+    def position_coordinates(self) -> array:
+        """Return x, y, width and height of each bounding box, one after another."""
+        self._decode_positions()
+        return self._coordinates
+
+    def position_timestamps_us(self) -> array:
+        self._decode_positions()
+        return self._timestamps_us
 
     def position_sequence(self):
-        positions = []
-        for position in self._raw_track['objectPositionSequence']:
-            positions.append(BoundingBox.from_box_data(**position['boundingBox']))
-        return positions
+        coordinates = self.position_coordinates()
+        return [
+            BoundingBox.from_box_data(*coordinates[offset:offset + 4])
+            for offset in range(0, len(coordinates), 4)]
+
+    def _decode_positions(self):
+        if self._coordinates is not None:
+            return
+        timestamps_us = array('q')
+        coordinates = array('d')
+        for position in self._raw_positions or ():
+            timestamps_us.append(int(position.get('timestampUs', 0)))
+            box = position['boundingBox']
+            coordinates.extend((box['x'], box['y'], box['width'], box['height']))
+        self._timestamps_us = timestamps_us
+        self._coordinates = coordinates
+        self._raw_positions = None
+
+    def _raw_position_sequence(self):
+        if self._raw_positions is not None:
+            return self._raw_positions
+        coordinates = self._coordinates
+        return [
+            {
+                'timestampUs': timestamp_us,
+                'boundingBox': dict(zip(('x', 'y', 'width', 'height'), coordinates[index * 4:index * 4 + 4])),
+                }
+            for index, timestamp_us in enumerate(self._timestamps_us)]
+
+    def as_dict(self):
+        return {
+            'id': self._track_id,
+            'objectTypeId': self._type_id,
+            'firstAppearanceTimeUs': self.start_us,
+            'lastAppearanceTimeUs': self.end_us,
+            'attributes': self._attributes,
+            # TODO: Add position sequence
+            }
 
     def to_json(self):
-        return json.dumps({
-            'id': self.track_id(),
-            'objectTypeId': self.type_id(),
-            'firstAppearanceTimeUs': self.time_period().start_ms,
-            'lastAppearanceTimeUs': self.time_period().end_ms if self.time_period().complete else None,
-            'attributes': self.attributes(),
-            # TODO: Add position sequence
-            })
+        return json.dumps(self.as_dict())
 
 
 class TimePeriod:
 
     def __init__(self, start_ms: int, duration_ms: Optional[int] = None):
         self.start_ms = start_ms
-        self.start = datetime.fromtimestamp(start_ms / 1000, timezone.utc)
         if duration_ms is None:
             self.complete = False
         else:
             self.complete = True
             self._duration_ms = duration_ms
-            self._duration_timedelta = timedelta(milliseconds=duration_ms)
-            self.duration_sec = self._duration_timedelta.total_seconds()
             self.end_ms = self.start_ms + self._duration_ms
-            self.end = self.start + self._duration_timedelta
+
+    @property
+    def start(self) -> datetime:
+        return datetime.fromtimestamp(self.start_ms / 1000, timezone.utc)
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(milliseconds=self._duration_ms)
+
+    @property
+    def duration_sec(self) -> float:
+        return self._duration_ms / 1000
+
+    def interval(self) -> Interval:
+        if not self.complete:
+            raise RuntimeError(f"Non-finished {self} has no interval")
+        return Interval(self.start_ms, self.end_ms)
 
     def __repr__(self):
         duration = f'duration_ms={self._duration_ms}' if self.complete else 'incomplete'
@@ -83,7 +165,7 @@ class TimePeriod:
         return hash((self.start_ms, self._duration_ms))
 
     @classmethod
-    def _from_filename(cls, filename):
+    def from_filename(cls, filename):
         [stem, _] = os.path.splitext(filename)
         try:
             [start_ms_str, duration_ms_str] = stem.split('_')
@@ -103,31 +185,44 @@ class TimePeriod:
             duration_ms = self._duration_ms + other._duration_ms
         return TimePeriod(self.start_ms, duration_ms)
 
-    def is_among(self, periods_list, tolerance_sec=1):
+    def is_among(self, periods, tolerance_sec=1):
+        """Whether one of the periods contains this one, trimmed by the tolerance.
+
+        Periods given as an IntervalSet are looked up by bisection; a sequence of
+        TimePeriod is scanned.
+        """
         trimmed = self.trim_left(tolerance_sec * 1000).trim_right(tolerance_sec * 1000)
-        log_lines = [f"Compare period {trimmed!r} with:", *(repr(period) for period in periods_list)]
-        _logger.debug("    \n".join(log_lines))
-        return any([period.contains(trimmed) for period in periods_list])
+        if isinstance(periods, IntervalSet):
+            return periods.contains(trimmed.interval())
+        if _logger.isEnabledFor(logging.DEBUG):
+            log_lines = [f"Compare period {trimmed!r} with:", *(repr(period) for period in periods)]
+            _logger.debug("    \n".join(log_lines))
+        return any(period.contains(trimmed) for period in periods)
 
     @staticmethod
     def consolidate(periods_list, tolerance_sec=0) -> Sequence['TimePeriod']:
-        tolerance = timedelta(seconds=tolerance_sec)
+        tolerance_ms = tolerance_sec * 1000
         try:
             [first, *others] = periods_list
         except ValueError:
             return []
         consolidated = [first]
         for period in others:
-            gap_length = period.start - consolidated[-1].end
-            if gap_length <= tolerance:
-                consolidated[-1] = consolidated[-1].extend(gap_length).join(period)
+            last = consolidated[-1]
+            if not last.complete:  # Covers everything after its start
+                continue
+            if period.complete and period.end_ms <= last.end_ms:  # Already covered
+                continue
+            if period.start_ms - last.end_ms <= tolerance_ms:
+                duration_ms = period.end_ms - last.start_ms if period.complete else None
+                consolidated[-1] = TimePeriod(last.start_ms, duration_ms)
             else:
                 consolidated.append(period)
         return consolidated
 
     @classmethod
     def list_from_filenames(cls, filename_list):
-        chunk_periods = [cls._from_filename(filename) for filename in filename_list]
+        chunk_periods = [cls.from_filename(filename) for filename in filename_list]
         return cls.consolidate(chunk_periods)
 
     def extend(self, delta: timedelta):
@@ -140,8 +235,7 @@ class TimePeriod:
     def calculate_gaps(periods_list):
         gaps_list = []
         for previous, current in zip(periods_list, periods_list[1:]):
-            gap_timedelta = current.start - previous.end
-            gaps_list.append(gap_timedelta.total_seconds())
+            gaps_list.append((current.start_ms - previous.end_ms) / 1000)
         return gaps_list
 
     @classmethod
@@ -178,7 +272,7 @@ class TimePeriod:
             raise RuntimeError(f"Non-finished {other} could not be compared")
         if self.start_ms > other.start_ms:
             return False
-        if self.end < other.end:
+        if self.end_ms < other.end_ms:
             return False
         return True
 
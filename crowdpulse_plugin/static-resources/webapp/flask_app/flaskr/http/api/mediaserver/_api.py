@@ -1,5 +1,6 @@
 import logging
 import urllib
+from contextlib import contextmanager
 from collections.abc import Collection
 from typing import Literal, Mapping, Any, Sequence
 from urllib.parse import urlparse
@@ -8,6 +9,7 @@ from ._analytics import AnalyticsTrack
 from ._mediaserver_http_exceptions import (
     MediaserverApiReadTimeout,
     MediaserverApiConnectionError,
+    MediaserverApiMalformedResponse,
     Forbidden,
     TooManyAttempts,
     BadRequest,
@@ -16,12 +18,13 @@ from ._mediaserver_http_exceptions import (
     NotFound,
     MediaserverApiHttpError,
 )
-from .._base_api import BaseApi
+from .._base_api import BaseApi, DEFAULT_HTTP_TIMEOUT
 from ... import (
     HttpReadTimeout,
     HttpConnectionError,
     HttpBearerAuthHandler,
     NoAuthHandler,
+    NonJsonResponse,
 )
 
 _logger = logging.getLogger(__name__)
@@ -88,32 +91,54 @@ class MediaserverApiV3(BaseApi):
             raise
         return response['token']
 
-    def list_analytics_objects_tracks(self, camera_id=None, start_time=None, end_time=None, **params) -> Sequence[AnalyticsTrack]:
-        submitted_params = {}
-        if camera_id is not None:
-            submitted_params = {'deviceId': camera_id}
-        if start_time is not None:
-            submitted_params = {'startTime': start_time}
-        if end_time is not None:
-            submitted_params = {**submitted_params, 'endTime': end_time}
-        submitted_params = {**submitted_params, **params}
-        response = self.http_get('/ec2/analyticsLookupObjectTracks', params=submitted_params)
-        result = [AnalyticsTrack(track) for track in response]
-        result = sorted(result, key=lambda k: k.time_period().start_ms)
-        return result
+    def list_analytics_objects_tracks(
+            self,
+            camera_id=None,
+            start_time=None,
+            end_time=None,
+            timeout: float = DEFAULT_HTTP_TIMEOUT,
+            **params,
+            ) -> Sequence[AnalyticsTrack]:
+        # Lookups of long ranges are large: tracks are decoded one by one as they arrive.
+        response = self.http_get(
+            '/ec2/analyticsLookupObjectTracks',
+            params=_analytics_tracks_params(camera_id, start_time, end_time, params),
+            timeout=timeout,
+            stream=True,
+            )
+        return _sorted_tracks(response)
 
     def _http_request(self, method, path, **kwargs):
-        try:
+        with self._translated_errors(method, path):
             response = self._request(method, path, **kwargs)
+            return self._handle_response(method, path, response)
+
+    def _iter_json_array(self, method, path, response):
+        with self._translated_errors(method, path):
+            yield from response.iter_json_array()
+
+    @contextmanager
+    def _translated_errors(self, method, path):
+        # Reading the body may fail as well, streamed bodies even while iterated.
+        try:
+            yield
         except HttpReadTimeout as e:
             raise MediaserverApiReadTimeout(self._netloc, '%r: %s %r: %s' % (self, method, path, e))
         except HttpConnectionError as e:
             raise MediaserverApiConnectionError(self._netloc, '%r: %s %r: %s' % (self, method, path, e))
+        except (ValueError, NonJsonResponse) as e:
+            raise MediaserverApiMalformedResponse(self._netloc, '%r: %s %r: %s' % (self, method, path, e))
+
+    def _handle_response(self, method, path, response):
+        if response.is_streamed and response.starts_json_array():
+            # Only a JSON object carries a Mediaserver error.
+            return self._iter_json_array(method, path, response)
         if len(response.content) > 1000:
             resp_logger = _logger.getChild('http_resp.large')
         else:
             resp_logger = _logger.getChild('http_resp.small')
-        resp_logger.debug("%s %s: JSON response:\n%s", method, path, response.json)
+        if resp_logger.isEnabledFor(logging.DEBUG):
+            resp_logger.debug("%s %s: JSON response:\n%s", method, path, response.json)
         self._raise_for_status(response, response.json)
         return self._retrieve_data(response, response.json)
 
@@ -182,3 +207,20 @@ class MediaserverApiV3(BaseApi):
                 raise BadRequest(self._netloc, response, vms_error_dict)
         if 400 <= response.status_code < 600 or vms_error_code != 0:
             raise MediaserverApiHttpError(self._netloc, response, vms_error_dict)
+
+
+def _analytics_tracks_params(camera_id, start_time, end_time, params):
+    submitted_params = {}
+    if camera_id is not None:
+        submitted_params = {'deviceId': camera_id}
+    if start_time is not None:
+        submitted_params = {**submitted_params, 'startTime': start_time}
+    if end_time is not None:
+        submitted_params = {**submitted_params, 'endTime': end_time}
+    return {**submitted_params, **params}
+
+
+def _sorted_tracks(response) -> Sequence[AnalyticsTrack]:
+    result = [AnalyticsTrack(track) for track in response]
+    result = sorted(result, key=lambda k: k.start_ms)
+    return result
@@ -0,0 +1,154 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+class Interval(NamedTuple):
+    """Milliseconds since epoch from start_ms, inclusive, to end_ms, exclusive."""
+
+    start_ms: int
+    end_ms: int
+
+    @property
+    def duration_ms(self) -> int:
+        return self.end_ms - self.start_ms
+
+    def overlaps(self, other: 'Interval') -> bool:
+        return self.start_ms < other.end_ms and other.start_ms < self.end_ms
+
+    def contains(self, other: 'Interval') -> bool:
+        return self.start_ms <= other.start_ms and other.end_ms <= self.end_ms
+
+    def intersection(self, other: 'Interval') -> Optional['Interval']:
+        start_ms = max(self.start_ms, other.start_ms)
+        end_ms = min(self.end_ms, other.end_ms)
+        if start_ms >= end_ms:
+            return None
+        return Interval(start_ms, end_ms)
+
+
+class IntervalSet:
+    """Disjoint intervals, sorted, with overlapping and touching ones merged.
+
+    Starts and ends are kept in two sorted lists, so a lookup is a bisection.
+    Adding one interval costs a bisection and a list splice; update(), union()
+    and intersection() merge whole sets in linear time.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        self._extend_sorted(sorted(intervals))
+
+    def __iter__(self) -> Iterator[Interval]:
+        return map(Interval, self._starts, self._ends)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self):
+        return f'IntervalSet({list(self)!r})'
+
+    def total_ms(self) -> int:
+        return sum(self._ends) - sum(self._starts)
+
+    def add(self, interval: Interval):
+        [start_ms, end_ms] = interval
+        if start_ms >= end_ms:
+            return
+        # Intervals from first to last, exclusive, overlap or touch the new one.
+        first = bisect_left(self._ends, start_ms)
+        last = bisect_right(self._starts, end_ms)
+        if first < last:
+            start_ms = min(start_ms, self._starts[first])
+            end_ms = max(end_ms, self._ends[last - 1])
+        self._starts[first:last] = [start_ms]
+        self._ends[first:last] = [end_ms]
+
+    def update(self, intervals: Iterable[Interval]):
+        merged = self.union(IntervalSet(intervals))
+        self._starts = merged._starts
+        self._ends = merged._ends
+
+    def union(self, other: 'IntervalSet') -> 'IntervalSet':
+        result = IntervalSet()
+        result._extend_sorted(_merge_sorted(list(self), list(other)))
+        return result
+
+    def intersection(self, other: 'IntervalSet') -> 'IntervalSet':
+        result = IntervalSet()
+        [mine, theirs] = [list(self), list(other)]
+        i = j = 0
+        while i < len(mine) and j < len(theirs):
+            common = mine[i].intersection(theirs[j])
+            if common is not None:
+                result._starts.append(common.start_ms)
+                result._ends.append(common.end_ms)
+            if mine[i].end_ms < theirs[j].end_ms:
+                i += 1
+            else:
+                j += 1
+        return result
+
+    def contains(self, interval: Interval) -> bool:
+        """Whether a single interval of the set covers the whole of the given one."""
+        index = bisect_right(self._starts, interval.start_ms) - 1
+        return index >= 0 and interval.end_ms <= self._ends[index]
+
+    def __contains__(self, ms: int) -> bool:
+        index = bisect_right(self._starts, ms) - 1
+        return index >= 0 and ms < self._ends[index]
+
+    def overlaps(self, interval: Interval) -> bool:
+        index = bisect_right(self._ends, interval.start_ms)
+        return index < len(self._starts) and self._starts[index] < interval.end_ms
+
+    def overlapping(self, interval: Interval) -> list[Interval]:
+        """Parts of the set within the given interval."""
+        first = bisect_right(self._ends, interval.start_ms)
+        last = bisect_left(self._starts, interval.end_ms)
+        return [
+            Interval(max(start_ms, interval.start_ms), min(end_ms, interval.end_ms))
+            for start_ms, end_ms in zip(self._starts[first:last], self._ends[first:last])]
+
+    def gaps(self, interval: Interval) -> list[Interval]:
+        """Parts of the given interval not covered by the set."""
+        gaps = []
+        cursor = interval.start_ms
+        for covered in self.overlapping(interval):
+            if covered.start_ms > cursor:
+                gaps.append(Interval(cursor, covered.start_ms))
+            cursor = covered.end_ms
+        if cursor < interval.end_ms:
+            gaps.append(Interval(cursor, interval.end_ms))
+        return gaps
+
+    def _extend_sorted(self, intervals: Iterable[Interval]):
+        starts = self._starts
+        ends = self._ends
+        for start_ms, end_ms in intervals:
+            if start_ms >= end_ms:
+                continue
+            if ends and start_ms <= ends[-1]:
+                if end_ms > ends[-1]:
+                    ends[-1] = end_ms
+            else:
+                starts.append(start_ms)
+                ends.append(end_ms)
+
+
+def _merge_sorted(first: list[Interval], second: list[Interval]) -> Iterator[Interval]:
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if first[i] <= second[j]:
+            yield first[i]
+            i += 1
+        else:
+            yield second[j]
+            j += 1
+    yield from first[i:]
+    yield from second[j:]
@@ -37,6 +37,10 @@ class MediaserverApiReadTimeout(MediaserverApiConnectionError):
     pass
 
 
+class MediaserverApiMalformedResponse(MediaserverApiConnectionError):
+    pass
+
+
 class Forbidden(MediaserverApiHttpError):
     pass
 
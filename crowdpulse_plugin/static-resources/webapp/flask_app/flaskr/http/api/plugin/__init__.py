@@ -1,5 +1,6 @@
-from ._api import PluginApi
+from ._api import PluginApi, PluginHttpError
 
 __all__ = [
     'PluginApi',
+    'PluginHttpError',
     ]
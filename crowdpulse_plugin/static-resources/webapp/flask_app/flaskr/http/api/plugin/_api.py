@@ -55,7 +55,8 @@ class PluginApi(BaseApi):
             resp_logger = _logger.getChild('http_resp.large')
         else:
             resp_logger = _logger.getChild('http_resp.small')
-        resp_logger.debug("%s %s: JSON response:\n%s", method, path, response.json)
+        if resp_logger.isEnabledFor(logging.DEBUG):
+            resp_logger.debug("%s %s: JSON response:\n%s", method, path, response.json)
         if response.status_code != 200:
             raise PluginHttpError(
                 f"{method} {path} responded with code {response.status_code}: {response.json}")
@@ -0,0 +1,97 @@
+import json
+import re
+import sys
+from typing import Any, Mapping, NamedTuple
+
+from .common import format_uuid
+
+_DEVICE_ID_RE = re.compile(rb'"deviceId"\s*:\s*"([^"\\]*)"')
+_TIMESTAMP_US_RE = re.compile(rb'"timestampUs"\s*:\s*"?(\d+)')
+_TRACK_ID_RE = re.compile(rb'"trackId"\s*:\s*"([^"\\]*)"')
+_TYPE_ID_RE = re.compile(rb'"typeId"\s*:\s*"([^"\\]*)"')
+
+# Cameras and object types are few, so canonical strings are computed once per raw value.
+_MAX_INTERNED = 10000
+_camera_ids: dict[bytes, str] = {}
+_type_ids: dict[bytes, str] = {}
+
+
+class DecodedTrack(NamedTuple):
+    """Fields of a plugin metadata packet; one item per object in the packet."""
+
+    camera_id: str
+    timestamp_us: int
+    track_ids: tuple[str, ...]
+    type_ids: tuple[str, ...]
+
+
+def decode_track(raw_track: bytes) -> DecodedTrack:
+    """Extract the fields needed for engagement from a raw plugin metadata packet.
+
+    Fields are picked by regular expressions without building the whole JSON tree.
+    Only if some field can't be found that way, e.g. the packet uses escapes,
+    a top-level key also appears in a nested object, or the packet isn't a whole
+    JSON object, it is parsed as JSON. Raise ValueError if the packet is malformed.
+    """
+    stripped = raw_track.strip()
+    if not stripped.startswith(b'{') or not stripped.endswith(b'}'):
+        return _decode_track_json(raw_track)
+    raw_device_ids = _DEVICE_ID_RE.findall(raw_track)
+    raw_timestamps_us = _TIMESTAMP_US_RE.findall(raw_track)
+    raw_track_ids = _TRACK_ID_RE.findall(raw_track)
+    raw_type_ids = _TYPE_ID_RE.findall(raw_track)
+    # Which of several matches is the top-level key, only the JSON structure tells.
+    if len(raw_device_ids) != 1 or len(raw_timestamps_us) != 1:
+        return _decode_track_json(raw_track)
+    if not raw_type_ids or len(raw_track_ids) != len(raw_type_ids):
+        return _decode_track_json(raw_track)
+    return DecodedTrack(
+        _canonical_camera_id(raw_device_ids[0]),
+        int(raw_timestamps_us[0]),
+        tuple(track_id.decode() for track_id in raw_track_ids),
+        tuple(map(_canonical_type_id, raw_type_ids)),
+        )
+
+
+def decode_track_dict(raw_track: Mapping[str, Any]) -> DecodedTrack:
+    try:
+        objects = raw_track['objectMetadataList']
+        if not objects:
+            raise ValueError("Malformed metadata track: empty objectMetadataList")
+        return DecodedTrack(
+            _canonical_camera_id(raw_track['deviceId'].encode()),
+            int(raw_track['timestampUs']),
+            tuple(o['trackId'] for o in objects),
+            tuple(_canonical_type_id(o['typeId'].encode()) for o in objects),
+            )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Malformed metadata track: {e!r}")
+
+
+def _decode_track_json(raw_track: bytes) -> DecodedTrack:
+    # Both JSONDecodeError and UnicodeDecodeError are ValueError.
+    return decode_track_dict(json.loads(raw_track))
+
+
+def _canonical_camera_id(raw_device_id: bytes) -> str:
+    try:
+        return _camera_ids[raw_device_id]
+    except KeyError:
+        camera_id = sys.intern(format_uuid(raw_device_id.decode()))
+        _remember(_camera_ids, raw_device_id, camera_id)
+        return camera_id
+
+
+def _canonical_type_id(raw_type_id: bytes) -> str:
+    try:
+        return _type_ids[raw_type_id]
+    except KeyError:
+        type_id = sys.intern(raw_type_id.decode())
+        _remember(_type_ids, raw_type_id, type_id)
+        return type_id
+
+
+def _remember(cache: dict[bytes, str], raw: bytes, canonical: str):
+    if len(cache) >= _MAX_INTERNED:
+        cache.clear()
+    cache[raw] = canonical
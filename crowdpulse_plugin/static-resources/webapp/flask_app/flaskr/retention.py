@@ -0,0 +1,161 @@
+import atexit
+import logging
+import threading
+import time
+from typing import Mapping, Optional
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .db import connect, pragmas_from_config
+
+_logger = logging.getLogger(__name__)
+
+_DAY_MS = 24 * 3600 * 1000
+
+
+def apply_retention(
+        connection,
+        now_ms: int,
+        raw_retention_days: float,
+        rollup_retention_days: Mapping[int, Optional[float]],
+        batch_size: int = 5000,
+        vacuum_pages: int = 1000,
+        allow_full_vacuum: bool = False,
+        ) -> dict[str, int]:
+    """Delete expired engagement data and give freed pages back to the file system.
+
+    Raw windows are already summed up in the rollups when written, so expiring them
+    keeps their history at rollup resolutions. Rollups of a resolution mapped to None
+    are kept forever. Rows are deleted in batches, each in its own short transaction,
+    so the ingest writer never waits for long.
+
+    Databases created before incremental auto-vacuum was enabled need a full VACUUM
+    once, which locks the whole database for as long as it takes. It only runs with
+    allow_full_vacuum, i.e. from the apply-retention command; until then freed pages
+    are only reused, not given back.
+    """
+    deleted_raw = _delete_in_batches(
+        connection,
+        'DELETE FROM camera_engagement_rate WHERE rowid IN ('
+        ' SELECT rowid FROM camera_engagement_rate WHERE timestamp_ < ? LIMIT ?)',
+        (_cutoff_ms(now_ms, raw_retention_days),),
+        batch_size,
+        )
+    deleted_rollups = 0
+    for resolution_ms, retention_days in rollup_retention_days.items():
+        if retention_days is None:
+            continue
+        deleted_rollups += _delete_in_batches(
+            connection,
+            'DELETE FROM camera_engagement_rollup WHERE rowid IN ('
+            ' SELECT rowid FROM camera_engagement_rollup WHERE resolution_ms = ? AND bucket_ms < ? LIMIT ?)',
+            (resolution_ms, _cutoff_ms(now_ms, retention_days)),
+            batch_size,
+            )
+    [[freelist_pages]] = connection.execute('PRAGMA freelist_count').fetchall()
+    _incremental_vacuum(connection, vacuum_pages, allow_full_vacuum)
+    return {
+        'deleted_raw_rows': deleted_raw,
+        'deleted_rollup_rows': deleted_rollups,
+        'freelist_pages': freelist_pages,
+        }
+
+
+def pruned_before_ms(config, now_ms: int) -> dict[int, int]:
+    """Return the time before which retention deletes data, by resolution, the raw one included."""
+    cutoffs = {config['ENGAGEMENT_FLUSH_INTERVAL_MS']: _cutoff_ms(now_ms, config['ENGAGEMENT_RAW_RETENTION_DAYS'])}
+    for resolution_ms, retention_days in config['ENGAGEMENT_ROLLUP_RETENTION_DAYS'].items():
+        if retention_days is not None:
+            cutoffs[resolution_ms] = _cutoff_ms(now_ms, retention_days)
+    return cutoffs
+
+
+def _cutoff_ms(now_ms, retention_days) -> int:
+    return now_ms - int(retention_days * _DAY_MS)
+
+
+def _delete_in_batches(connection, query, params, batch_size) -> int:
+    deleted = 0
+    while True:
+        with connection:
+            cursor = connection.execute(query, (*params, batch_size))
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+def _incremental_vacuum(connection, pages, allow_full_vacuum):
+    [[auto_vacuum]] = connection.execute('PRAGMA auto_vacuum').fetchall()
+    if auto_vacuum != 2:
+        if not allow_full_vacuum:
+            _logger.warning(
+                "Database is not in incremental auto-vacuum mode, run 'flask apply-retention'"
+                " while the app is stopped to switch it over")
+            return
+        _logger.info("Switching database to incremental auto-vacuum")
+        connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        connection.execute('VACUUM')
+        return
+    connection.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+
+
+class RetentionScheduler:
+    """Run apply_retention() periodically on a background thread."""
+
+    def __init__(self, app, interval_sec: float):
+        self._app = app
+        self._interval_sec = interval_sec
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='RetentionScheduler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self._interval_sec):
+            try:
+                result = _apply_retention_from_config(self._app.config)
+            except Exception:
+                _logger.exception("Engagement data retention failed")
+            else:
+                _logger.info("Applied engagement data retention: %s", result)
+
+
+def _apply_retention_from_config(config, allow_full_vacuum=False):
+    connection = connect(config['DATABASE'], pragmas_from_config(config))
+    try:
+        return apply_retention(
+            connection,
+            now_ms=int(time.time() * 1000),
+            raw_retention_days=config['ENGAGEMENT_RAW_RETENTION_DAYS'],
+            rollup_retention_days=config['ENGAGEMENT_ROLLUP_RETENTION_DAYS'],
+            batch_size=config['ENGAGEMENT_RETENTION_BATCH_SIZE'],
+            allow_full_vacuum=allow_full_vacuum,
+            )
+    finally:
+        connection.close()
+
+
+@click.command('apply-retention')
+@with_appcontext
+def apply_retention_command():
+    """Delete expired engagement data and compact the database."""
+    result = _apply_retention_from_config(current_app.config, allow_full_vacuum=True)
+    click.echo(
+        f"Deleted {result['deleted_raw_rows']} raw and {result['deleted_rollup_rows']} rollup rows.")
+
+
+def init_app(app):
+    app.cli.add_command(apply_retention_command)
+    interval_sec = app.config['ENGAGEMENT_RETENTION_INTERVAL_SEC']
+    if interval_sec:
+        scheduler = RetentionScheduler(app, interval_sec)
+        scheduler.start()
+        atexit.register(scheduler.stop)
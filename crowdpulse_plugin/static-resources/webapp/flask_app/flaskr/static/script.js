@@ -201,78 +201,93 @@ async function getNewThreshold() {
 }
 
 async function fetchData() {
-    try {  // Fetch from selected camera
-        let response = await fetch(`http://127.0.0.1:${webAppPort}/camera_data/${currentCamera}`);
+    try {  // Fetch the latest point from selected camera
+        let response = await fetch(`http://127.0.0.1:${webAppPort}/camera_data/${currentCamera}?limit=1`);
         if (!response.ok) throw new Error(`Server error: ${response.status}`);
 
         let historyData = await response.json();
-        let latestData = historyData[historyData.length - 1];
+        addDataPoint(historyData[historyData.length - 1]);
+    } catch (error) {
+        console.error("Fetch error:", error);
+        document.getElementById('data').innerText = "Failed to load data!";
+        document.getElementById('time').innerText = "Error retrieving timestamp!";
+    }
+}
 
-        document.getElementById('data').innerText = `Message: ${latestData.message}, Value: ${latestData.value}`;
-        document.getElementById('time').innerText = `Timestamp: ${latestData.timestamp}`;
+function addDataPoint(latestData) {
+    document.getElementById('data').innerText = `Message: ${latestData.message}, Value: ${latestData.value}`;
+    document.getElementById('time').innerText = `Timestamp: ${latestData.timestamp}`;
 
-        // Add only the latest data point if it's new
-        if (!dataPoints.length || dataPoints[dataPoints.length - 1].timestamp !== latestData.timestamp) {
-            dataPoints.push({ timestamp: latestData.timestamp, value: latestData.value });
+    // Add only the latest data point if it's new
+    if (!dataPoints.length || dataPoints[dataPoints.length - 1].timestamp !== latestData.timestamp) {
+        dataPoints.push({ timestamp: latestData.timestamp, value: latestData.value });
 
-            // Shift if max history exceeded
-            if (dataPoints.length > maxDataPoints) {
-                dataPoints.shift();
-                chart.data.labels.shift();
-                chart.data.datasets[0].data.shift();
-            }
+        // Shift if max history exceeded
+        if (dataPoints.length > maxDataPoints) {
+            dataPoints.shift();
+            chart.data.labels.shift();
+            chart.data.datasets[0].data.shift();
+        }
 
-            chart.data.labels.push(latestData.timestamp);
-            chart.data.datasets[0].data.push(latestData.value);
-            chart.update();
+        chart.data.labels.push(latestData.timestamp);
+        chart.data.datasets[0].data.push(latestData.value);
+        chart.update();
 
-            let processedData = breakSegments(dataPoints);
+        let processedData = breakSegments(dataPoints);
 
-            // Update chart data
-            chart.data.labels = processedData.newLabels;
-            chart.data.datasets[0].data = processedData.newData;
+        // Update chart data
+        chart.data.labels = processedData.newLabels;
+        chart.data.datasets[0].data = processedData.newData;
 
-            function updateEventIcon() {
-                if (dataPoints.length < 1) return;
-                let sum = 0
-                dataPoints.forEach(point => {
-                    sum += point.value;
-                    }
-                )
-                let average = sum / dataPoints.length
-                console.log(average)
-
-                let lowerLimit = threshold - 10;
-                let upperLimit = threshold + 10;
-
-                if (average < lowerLimit) {
-                    iconPath = "boring_event.svg";
-                } else if (average > upperLimit) {
-                    iconPath = "interesting_event.svg";
-                } else {
-                    iconPath = "meh_event.svg";
+        function updateEventIcon() {
+            if (dataPoints.length < 1) return;
+            let sum = 0
+            dataPoints.forEach(point => {
+                sum += point.value;
                 }
-                document.getElementById("eventIcon").src = `/static/icons/${iconPath}`;
+            )
+            let average = sum / dataPoints.length
+            console.log(average)
+
+            let lowerLimit = threshold - 10;
+            let upperLimit = threshold + 10;
+
+            if (average < lowerLimit) {
+                iconPath = "boring_event.svg";
+            } else if (average > upperLimit) {
+                iconPath = "interesting_event.svg";
+            } else {
+                iconPath = "meh_event.svg";
             }
-            chart.update()
-            updateEventIcon();
+            document.getElementById("eventIcon").src = `/static/icons/${iconPath}`;
         }
-
-    } catch (error) {
-        console.error("Fetch error:", error);
-        document.getElementById('data').innerText = "Failed to load data!";
-        document.getElementById('time').innerText = "Error retrieving timestamp!";
+        chart.update()
+        updateEventIcon();
     }
 }
 
+let eventSource = null;
+
+// New points are pushed by the server; EventSource reconnects by itself, resuming from the last event.
+function subscribeToCamera() {
+    if (eventSource !== null) eventSource.close();
+    eventSource = new EventSource(`http://127.0.0.1:${webAppPort}/camera_data/${currentCamera}/stream`);
+    eventSource.addEventListener("engagement", event => addDataPoint(JSON.parse(event.data)));
+}
+
 // Handle camera selection change
 cameraSelect.addEventListener("change", async function () {
     currentCamera = this.value;
     chart.data.datasets[0].borderColor = "blue";
     chart.data.datasets[0].label = `Value from ${currentCamera.toUpperCase()}`;
     await loadHistory();
+    if (window.EventSource) subscribeToCamera();
 });
 
-setInterval(fetchData, 2000);
+if (window.EventSource) {
+    subscribeToCamera();
+} else {
+    setInterval(fetchData, 2000);
+}
 loadHistory();
 getNewThreshold();
\ No newline at end of file
@@ -0,0 +1,255 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence
+
+from .http.api.mediaserver import AnalyticsTrack, Interval, IntervalSet
+
+_logger = logging.getLogger(__name__)
+
+_END_OF_TIME_MS = 2 ** 63 - 1
+
+
+class _CameraTracks:
+    """Tracks of one camera fetched for the covered periods, sorted by start.
+
+    Every track overlapping a covered period is complete and stored here. The
+    lock guards all the fields; file_lock serializes stores, so that the file
+    follows the fields in the same order.
+    """
+
+    __slots__ = (
+        'lock', 'file_lock', 'loaded', 'covered', 'starts', 'tracks', 'track_ids', 'max_duration_ms',
+        'counted_tracks')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.loaded = False
+        self.covered = IntervalSet()
+        self.starts: list[int] = []
+        self.tracks: list[AnalyticsTrack] = []
+        self.track_ids: set[str] = set()
+        self.max_duration_ms = 0
+        # Tracks in the cache-wide count, guarded by the cache lock.
+        self.counted_tracks = 0
+
+    def add(self, tracks: Iterable[AnalyticsTrack]) -> list[AnalyticsTrack]:
+        """Add tracks not stored yet and return them."""
+        added = []
+        for track in tracks:
+            track_id = track.track_id()
+            if track_id not in self.track_ids:
+                self.track_ids.add(track_id)
+                self.max_duration_ms = max(self.max_duration_ms, track.end_ms - track.start_ms)
+                added.append(track)
+        if added:
+            added.sort(key=_start_ms)
+            self.tracks = list(heapq.merge(self.tracks, added, key=_start_ms))
+            self.starts = [track.start_ms for track in self.tracks]
+        return added
+
+    def trim(self, max_tracks: int) -> int:
+        """Forget the oldest tracks and periods down to max_tracks tracks; return how many went."""
+        if len(self.tracks) <= max_tracks:
+            return 0
+        ends_ms = sorted(track.end_ms for track in self.tracks)
+        # Tracks ending from the cutoff on are kept, and so is every period from it on.
+        cutoff_ms = ends_ms[len(ends_ms) - max_tracks - 1] + 1
+        kept = [track for track in self.tracks if track.end_ms >= cutoff_ms]
+        self.covered = IntervalSet(self.covered.overlapping(Interval(cutoff_ms, _END_OF_TIME_MS)))
+        self.tracks = kept
+        self.starts = [track.start_ms for track in kept]
+        self.track_ids = {track.track_id() for track in kept}
+        return len(ends_ms) - len(kept)
+
+    def overlapping(self, start_ms: int, end_ms: int) -> list[AnalyticsTrack]:
+        # No track starting before first can reach start_ms.
+        first = bisect_left(self.starts, start_ms - self.max_duration_ms)
+        last = bisect_right(self.starts, end_ms)
+        return [track for track in self.tracks[first:last] if track.end_ms >= start_ms]
+
+
+class TrackRangeCache:
+    """Analytics tracks of past time ranges, fetched from the Mediaserver once.
+
+    For each camera the cache remembers which periods were fetched. A lookup only
+    fetches the gaps between them, and periods are consolidated as they grow.
+    Tracks newer than settle_sec may still change, so that part of a range is always
+    fetched and never cached, and neither is a track still going on before it: the
+    period is covered only up to its start. Cameras are evicted least recently used
+    first once the cache holds more than max_tracks tracks, and a camera holding
+    more than that alone forgets its oldest tracks and the periods they overlap.
+    If directory is given, newly fetched periods are also appended to a file per
+    camera, so they survive eviction and restarts. The file is rewritten whenever
+    its camera forgets tracks, loading included, so it stays within max_tracks too.
+
+    Each camera has its own lock, the shared one only guards the LRU order.
+    Mediaserver requests are done without holding either, and so are file writes
+    other than the one of loading.
+    """
+
+    def __init__(self, max_tracks: int = 200_000, settle_sec: float = 60, directory: Optional[str] = None):
+        self._max_tracks = max_tracks
+        self._settle_ms = settle_sec * 1000
+        self._directory = directory
+        self._cameras: OrderedDict[str, _CameraTracks] = OrderedDict()
+        self._track_count = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_tracks(
+            self,
+            mediaserver_api,
+            camera_id: str,
+            start_ms: float,
+            end_ms: Optional[float] = None,
+            timeout: Optional[float] = None,
+            ) -> Sequence[AnalyticsTrack]:
+        """Return tracks of the camera overlapping the range, sorted by start."""
+        start_ms = int(start_ms)
+        now_ms = int(time.time() * 1000)
+        end_ms = now_ms if end_ms is None else int(end_ms)
+        settle_boundary_ms = now_ms - int(self._settle_ms)
+        settled_ms = min(end_ms, settle_boundary_ms)
+        tracks = {}
+        if start_ms < settled_ms:
+            camera = self._get_camera(camera_id)
+            with camera.lock:
+                gaps = camera.covered.gaps(Interval(start_ms, settled_ms))
+                # Taken along with the gaps: storing the fetched tracks may forget these.
+                cached = camera.overlapping(start_ms, settled_ms)
+            fetched = []
+            for gap in gaps:
+                fetched.extend(_list_tracks(mediaserver_api, camera_id, gap.start_ms, gap.end_ms, timeout))
+            for track in itertools.chain(cached, fetched):
+                tracks[track.track_id()] = track
+            self._store(camera_id, camera, gaps, fetched, settle_boundary_ms)
+        if settled_ms < end_ms:
+            for track in _list_tracks(mediaserver_api, camera_id, max(start_ms, settled_ms), end_ms, timeout):
+                tracks[track.track_id()] = track
+        return sorted(tracks.values(), key=lambda t: t.start_ms)
+
+    def _get_camera(self, camera_id) -> _CameraTracks:
+        with self._lock:
+            camera = self._cameras.get(camera_id)
+            if camera is None:
+                camera = self._cameras[camera_id] = _CameraTracks()
+            self._cameras.move_to_end(camera_id)
+        with camera.lock:
+            if not camera.loaded:
+                self._load(camera_id, camera)
+                camera.loaded = True
+                self._count_tracks(camera_id, camera, len(camera.tracks))
+        return camera
+
+    def _store(self, camera_id, camera: _CameraTracks, gaps: Sequence[Interval], fetched, settle_boundary_ms):
+        if not gaps:
+            return
+        complete = [track for track in fetched if track.end_ms <= settle_boundary_ms]
+        # A track still going on is not cached, so nothing from its start on is covered.
+        covered_until_ms = min(
+            (track.start_ms for track in fetched if track.end_ms > settle_boundary_ms),
+            default=gaps[-1].end_ms)
+        covered = [
+            Interval(gap.start_ms, min(gap.end_ms, covered_until_ms))
+            for gap in gaps if gap.start_ms < covered_until_ms]
+        with camera.file_lock:
+            with camera.lock:
+                added = camera.add(complete)
+                camera.covered.update(covered)
+                removed = camera.trim(self._max_tracks)
+                kept_covered = list(camera.covered)
+                kept_tracks = camera.tracks
+            self._count_tracks(camera_id, camera, len(added) - removed)
+            if removed:
+                self._rewrite(camera_id, kept_covered, kept_tracks)
+            else:
+                self._append(camera_id, covered, added)
+
+    def _count_tracks(self, camera_id, camera: _CameraTracks, count_change):
+        with self._lock:
+            if self._cameras.get(camera_id) is not camera:
+                # Evicted meanwhile, its tracks are not counted anymore.
+                return
+            self._track_count += count_change
+            camera.counted_tracks += count_change
+            while self._track_count > self._max_tracks and len(self._cameras) > 1:
+                [evicted_id, evicted] = self._cameras.popitem(last=False)
+                self._track_count -= evicted.counted_tracks
+                _logger.debug("Evicted analytics tracks of camera %s from memory", evicted_id)
+
+    def _path(self, camera_id):
+        return os.path.join(self._directory, re.sub(r'[^\w.-]', '_', camera_id) + '.jsonl')
+
+    def _load(self, camera_id, camera: _CameraTracks):
+        # Each line holds periods and the complete tracks fetched for them.
+        if self._directory is None:
+            return
+        try:
+            with open(self._path(camera_id)) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            _logger.warning("Ignoring unreadable track cache of camera %s: %s", camera_id, e)
+            return
+        for line in lines:
+            try:
+                data = json.loads(line)
+                covered = [Interval(start, end) for start, end in data['covered']]
+                tracks = [AnalyticsTrack(raw_track) for raw_track in data['tracks']]
+            except (ValueError, KeyError, TypeError) as e:
+                # E.g. a line cut short by a crash; its periods are fetched again.
+                _logger.warning("Ignoring a corrupt line of the track cache of camera %s: %s", camera_id, e)
+                continue
+            camera.add(tracks)
+            camera.covered.update(covered)
+        if camera.trim(self._max_tracks):
+            # Before any store, which would append to the file.
+            self._rewrite(camera_id, list(camera.covered), camera.tracks)
+
+    def _append(self, camera_id, covered: Sequence[Interval], tracks: Sequence[AnalyticsTrack]):
+        if self._directory is None or not covered:
+            return
+        try:
+            with open(self._path(camera_id), 'a') as f:
+                f.write(_dump_line(covered, tracks))
+        except OSError as e:
+            _logger.warning("Failed to persist track cache of camera %s: %s", camera_id, e)
+
+    def _rewrite(self, camera_id, covered: Sequence[Interval], tracks: Sequence[AnalyticsTrack]):
+        if self._directory is None:
+            return
+        path = self._path(camera_id)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                f.write(_dump_line(covered, tracks))
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            _logger.warning("Failed to rewrite track cache of camera %s: %s", camera_id, e)
+
+
+def _dump_line(covered: Sequence[Interval], tracks: Sequence[AnalyticsTrack]) -> str:
+    return json.dumps({
+        'covered': [list(interval) for interval in covered],
+        'tracks': [track.raw() for track in tracks],
+        }) + '\n'
+
+
+def _start_ms(track: AnalyticsTrack):
+    return track.start_ms
+
+
+def _list_tracks(mediaserver_api, camera_id, start_ms, end_ms, timeout):
+    kwargs = {} if timeout is None else {'timeout': timeout}
+    return mediaserver_api.list_analytics_objects_tracks(
+        camera_id=camera_id, start_time=start_ms, end_time=end_ms, **kwargs)
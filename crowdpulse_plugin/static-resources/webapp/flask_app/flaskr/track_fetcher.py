@@ -0,0 +1,136 @@
+import atexit
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Collection, Iterator, NamedTuple, Optional, Sequence
+
+from .http.api.mediaserver import AnalyticsTrack, MediaserverApiConnectionError, MediaserverApiHttpError
+from .track_cache import TrackRangeCache
+
+_logger = logging.getLogger(__name__)
+
+
+class FetchedTracks(NamedTuple):
+    """Tracks of all cameras that answered, sorted by start, and cameras that did not."""
+
+    tracks: Sequence[AnalyticsTrack]
+    failed_camera_ids: Sequence[str]
+
+
+class AnalyticsTrackFetcher:
+    """Look up analytics tracks of many cameras concurrently.
+
+    The pool is shared by all requests, so max_workers caps the number of
+    lookups the Mediaserver gets at once. A camera that doesn't answer within
+    timeout_sec, or fails, is reported instead of failing the whole lookup;
+    deadline_sec bounds the whole lookup when the pool is busy. With a cache,
+    only the parts of the range not fetched before go to the Mediaserver.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = 8,
+            timeout_sec: float = 10,
+            deadline_sec: float = 30,
+            cache: Optional[TrackRangeCache] = None,
+            ):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='AnalyticsTrackFetcher')
+        self._timeout_sec = timeout_sec
+        self._deadline_sec = deadline_sec
+        self._cache = cache
+
+    def fetch(
+            self,
+            mediaserver_api,
+            camera_ids: Collection[str],
+            start_ms: float,
+            end_ms: Optional[float] = None,
+            ) -> FetchedTracks:
+        futures = {
+            camera_id: self._executor.submit(self._fetch_camera, mediaserver_api, camera_id, start_ms, end_ms)
+            for camera_id in camera_ids}
+        wait(futures.values(), timeout=self._deadline_sec)
+        per_camera_tracks = []
+        failed_camera_ids = []
+        for camera_id, future in futures.items():
+            if not future.done():
+                future.cancel()
+                _logger.warning("Analytics tracks of camera %s are not fetched in time", camera_id)
+                failed_camera_ids.append(camera_id)
+                continue
+            try:
+                per_camera_tracks.append(future.result())
+            except (MediaserverApiConnectionError, MediaserverApiHttpError) as e:
+                # TODO: Process camera non-existent case (e.g. deleted from Mediaserver)
+                _logger.warning("Failed to fetch analytics tracks of camera %s: %s", camera_id, e)
+                failed_camera_ids.append(camera_id)
+        # Each camera's tracks are already sorted, merging them is linear.
+        tracks = list(heapq.merge(*per_camera_tracks, key=_start_ms))
+        return FetchedTracks(tracks, failed_camera_ids)
+
+    def fetch_chunks(
+            self,
+            mediaserver_api,
+            camera_ids: Collection[str],
+            start_ms: float,
+            end_ms: float,
+            chunk_ms: float,
+            ) -> Iterator[FetchedTracks]:
+        """Yield tracks of the range a chunk of time at a time, each chunk fetched like fetch().
+
+        The Mediaserver returns every track overlapping a chunk, so a track is only
+        yielded with the chunk it starts in. The next chunk is fetched while the
+        caller consumes the current one.
+        """
+        chunks = []
+        chunk_start = start_ms
+        while chunk_start < end_ms:
+            chunk_end = min(chunk_start + chunk_ms, end_ms)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+        if not chunks:
+            return
+        # fetch() waits on the pool, so it runs on a thread of its own; the lookups go to the pool.
+        with ThreadPoolExecutor(1, thread_name_prefix='AnalyticsTrackChunks') as prefetcher:
+            next_fetched = prefetcher.submit(self.fetch, mediaserver_api, camera_ids, *chunks[0])
+            for index, [chunk_start, chunk_end] in enumerate(chunks):
+                fetched = next_fetched.result()
+                if index + 1 < len(chunks):
+                    next_fetched = prefetcher.submit(self.fetch, mediaserver_api, camera_ids, *chunks[index + 1])
+                lower = float('-inf') if index == 0 else chunk_start
+                upper = float('inf') if index + 1 == len(chunks) else chunk_end
+                yield fetched._replace(tracks=[t for t in fetched.tracks if lower <= t.start_ms < upper])
+
+    def _fetch_camera(self, mediaserver_api, camera_id, start_ms, end_ms):
+        if self._cache is not None:
+            return self._cache.get_tracks(mediaserver_api, camera_id, start_ms, end_ms, self._timeout_sec)
+        params = {'start_time': start_ms, 'timeout': self._timeout_sec}
+        if end_ms is not None:
+            params = {**params, 'end_time': end_ms}
+        return mediaserver_api.list_analytics_objects_tracks(camera_id=camera_id, **params)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _start_ms(track: AnalyticsTrack):
+    return track.start_ms
+
+
+def init_app(app):
+    if app.config['ANALYTICS_CACHE_MAX_TRACKS']:
+        cache = TrackRangeCache(
+            max_tracks=app.config['ANALYTICS_CACHE_MAX_TRACKS'],
+            settle_sec=app.config['ANALYTICS_CACHE_SETTLE_SEC'],
+            directory=app.config['ANALYTICS_CACHE_DIR'],
+            )
+    else:
+        cache = None
+    fetcher = AnalyticsTrackFetcher(
+        max_workers=app.config['ANALYTICS_FETCH_CONCURRENCY'],
+        timeout_sec=app.config['ANALYTICS_FETCH_TIMEOUT_SEC'],
+        deadline_sec=app.config['ANALYTICS_FETCH_DEADLINE_SEC'],
+        cache=cache,
+        )
+    app.config['ANALYTICS_TRACK_FETCHER'] = fetcher
+    atexit.register(fetcher.shutdown)
@@ -0,0 +1,37 @@
+"""Compare the fast-path metadata decoder with full JSON parsing.
+
+Run from the webapp directory: python -m flask_app.tests.benchmark_metadata_decoder
+"""
+import json
+import timeit
+
+from flask_app.flaskr.common import format_uuid
+from flask_app.flaskr.metadata_decoder import DecodedTrack, decode_track
+from flask_app.tests._plugin_metadata_sample import metadata_sample
+
+
+def _decode_track_with_json(raw_track: bytes) -> DecodedTrack:
+    parsed = json.loads(raw_track)
+    objects = parsed['objectMetadataList']
+    return DecodedTrack(
+        format_uuid(parsed['deviceId']),
+        int(parsed['timestampUs']),
+        tuple(o['trackId'] for o in objects),
+        tuple(o['typeId'] for o in objects),
+        )
+
+
+def main():
+    raw_tracks = [json.dumps(raw_track).encode() for raw_track in metadata_sample]
+    assert [decode_track(t) for t in raw_tracks] == [_decode_track_with_json(t) for t in raw_tracks]
+    number = 20000
+    results = {}
+    for name, decode in (('json', _decode_track_with_json), ('fast path', decode_track)):
+        duration = min(timeit.repeat(lambda: [decode(t) for t in raw_tracks], number=number, repeat=5))
+        results[name] = duration
+        print(f"{name:>10}: {duration / (number * len(raw_tracks)) * 1e6:.2f} us per track")
+    print(f"Speed-up: {results['json'] / results['fast path']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from flask_app.flaskr.alert_dispatcher import AlertDispatcher
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+
+
+class _FakeApp:
+
+    def __init__(self, plugin_api):
+        self.config = {'PLUGIN_API': plugin_api}
+
+
+class _RecordingPluginApi:
+
+    def __init__(self):
+        self.sent_types = []
+        self.sent_event = threading.Event()
+
+    def send_analytics_event(self, type_, camera_id, **kwargs):
+        self.sent_types.append(type_)
+        self.sent_event.set()
+
+
+class TestAlertDispatcher(unittest.TestCase):
+
+    def test_alerts_fire_on_transitions_only(self):
+        plugin_api = _RecordingPluginApi()
+        dispatcher = AlertDispatcher(_FakeApp(plugin_api), hysteresis=0.05)
+        for rate in (0.6, 0.4, 0.3, 0.2, 0.52, 0.56, 0.7, 0.4):
+            dispatcher.report(device_id_1, rate, threshold=0.5)
+        dispatcher.start()
+        dispatcher.stop()
+        self.assertListEqual(['tigre.engagementBelowLevel'], plugin_api.sent_types)
+
+    def test_alerts_are_delivered_in_order(self):
+        plugin_api = _RecordingPluginApi()
+        dispatcher = AlertDispatcher(_FakeApp(plugin_api), hysteresis=0.05)
+        dispatcher.start()
+        dispatcher.report(device_id_1, 0.4, threshold=0.5)
+        self.assertTrue(plugin_api.sent_event.wait(5))
+        dispatcher.report(device_id_1, 0.6, threshold=0.5)
+        dispatcher.stop()
+        self.assertListEqual(
+            ['tigre.engagementBelowLevel', 'tigre.engagementAboveLevel'], plugin_api.sent_types)
+
+    def test_crossing_back_cancels_pending_alert(self):
+        plugin_api = _RecordingPluginApi()
+        dispatcher = AlertDispatcher(_FakeApp(plugin_api), hysteresis=0.05)
+        self.assertIs(True, dispatcher.report(device_id_1, 0.4, threshold=0.5))
+        self.assertIs(False, dispatcher.report(device_id_1, 0.6, threshold=0.5))
+        dispatcher.start()
+        dispatcher.stop()
+        self.assertListEqual([], plugin_api.sent_types)
+
+    def test_dropped_alert_is_reported_again(self):
+        plugin_api = _RecordingPluginApi()
+        dispatcher = AlertDispatcher(_FakeApp(plugin_api), hysteresis=0.05, max_pending=1)
+        dispatcher.report(device_id_1, 0.4, threshold=0.5)
+        self.assertIsNone(dispatcher.report(device_id_2, 0.4, threshold=0.5))
+        dispatcher.start()
+        self.assertTrue(plugin_api.sent_event.wait(5))
+        self.assertIs(True, dispatcher.report(device_id_2, 0.4, threshold=0.5))
+        dispatcher.stop()
+        self.assertListEqual(
+            ['tigre.engagementBelowLevel', 'tigre.engagementBelowLevel'], plugin_api.sent_types)
+
+    def test_undelivered_alert_is_reported_again(self):
+        dispatcher = AlertDispatcher(_FakeApp(None), hysteresis=0.05)
+        self.assertIs(True, dispatcher.report(device_id_1, 0.4, threshold=0.5))
+        dispatcher.start()
+        dispatcher.stop()
+        self.assertIs(True, dispatcher.report(device_id_1, 0.4, threshold=0.5))
@@ -0,0 +1,130 @@
+import datetime
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from flask_app.flaskr import create_app
+from flask_app.flaskr.archive_coverage import ArchiveCoverageIndex
+from flask_app.flaskr.db import get_db
+from flask_app.flaskr.engagement_rollup import update_rollups
+from flask_app.flaskr.http.api.mediaserver import Interval
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+
+
+class TestArchiveCoverageIndex(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.camera_dir = os.path.join(directory.name, 'hi_quality', 'camera')
+        self.index = ArchiveCoverageIndex({device_id_1: [self.camera_dir]})
+
+    def _write_chunk(self, hour, name):
+        hour_dir = os.path.join(self.camera_dir, '2025', '03', '01', hour)
+        os.makedirs(hour_dir, exist_ok=True)
+        open(os.path.join(hour_dir, name), 'w').close()
+
+    def _recorded(self):
+        return list(self.index.recorded(device_id_1, Interval(0, 10_000)))
+
+    def test_chunks_are_indexed_incrementally(self):
+        self._write_chunk('10', '1000_1000.mkv')
+        self._write_chunk('10', '2000_500.mkv')
+        self._write_chunk('10', '3000.mkv')  # Being recorded
+        self.index.scan()
+        self.assertListEqual([Interval(1000, 2500)], self._recorded())
+        self._write_chunk('10', '3000_1000.mkv')
+        self._write_chunk('11', '4000_2000.mkv')
+        self.index.scan()
+        self.assertListEqual([Interval(1000, 2500), Interval(3000, 6000)], self._recorded())
+        self._write_chunk('11', '8000_1000.mkv')
+        self._write_chunk('11', 'info.txt')
+        self.index.scan()
+        self.assertListEqual([Interval(1000, 2500), Interval(3000, 6000), Interval(8000, 9000)], self._recorded())
+
+    def test_rotated_chunks_are_forgotten(self):
+        self._write_chunk('10', '1000_1000.mkv')
+        self._write_chunk('11', '3000_1000.mkv')
+        self.index.scan()
+        self.index.scan()
+        shutil.rmtree(os.path.join(self.camera_dir, '2025', '03', '01', '10'))
+        self.index.scan()
+        self.assertListEqual([Interval(3000, 4000)], self._recorded())
+
+    def test_deleted_chunks_are_forgotten(self):
+        self._write_chunk('10', '1000_1000.mkv')
+        self._write_chunk('10', '2000_1000.mkv')
+        self._write_chunk('11', '3000_1000.mkv')
+        hour_dir = os.path.join(self.camera_dir, '2025', '03', '01', '10')
+        # As if the directories were last modified long ago.
+        for path in (hour_dir, os.path.dirname(hour_dir)):
+            os.utime(path, ns=(0, 0))
+        self.index.scan()
+        self.assertListEqual([Interval(1000, 4000)], self._recorded())
+        os.remove(os.path.join(hour_dir, '1000_1000.mkv'))
+        self.index.scan()
+        self.assertListEqual([Interval(2000, 4000)], self._recorded())
+
+    def test_unreadable_directories_are_skipped(self):
+        self._write_chunk('10', '1000_1000.mkv')
+        not_a_dir = os.path.join(os.path.dirname(self.camera_dir), 'not_a_dir')
+        open(not_a_dir, 'w').close()
+        self.index = ArchiveCoverageIndex({device_id_1: [not_a_dir, self.camera_dir]})
+        with self.assertLogs('flask_app.flaskr.archive_coverage', 'WARNING'):
+            self.index.scan()
+        self.assertListEqual([Interval(1000, 2000)], self._recorded())
+
+
+class TestCoverageEndpoint(unittest.TestCase):
+
+    def test_video_and_analytics_periods_of_event_cameras(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        start_ms = (int(time.time() * 1000) - 3600_000) // 60_000 * 60_000
+        hour_dir = os.path.join(directory.name, 'archive', '2025', '03', '01', '10')
+        os.makedirs(hour_dir)
+        for offset_ms in (0, 60_000, 600_000):
+            open(os.path.join(hour_dir, f'{start_ms + offset_ms}_60000.mkv'), 'w').close()
+        app = create_app({
+            'TESTING': True,
+            'DATABASE': os.path.join(directory.name, 'test.sqlite'),
+            'ENGAGEMENT_RETENTION_INTERVAL_SEC': 0,
+            'ANALYTICS_CACHE_DIR': None,
+            'ARCHIVE_CAMERA_DIRS': {device_id_1: [os.path.join(directory.name, 'archive')]},
+            })
+        self.addCleanup(app.config['ARCHIVE_COVERAGE'].stop)
+        # Not to wait for the first scan, which is in the background.
+        app.config['ARCHIVE_COVERAGE'].scan()
+        self.addCleanup(app.config['ENGAGEMENT_RATE_WRITER'].stop)
+        with app.app_context():
+            db = get_db()
+            db.execute("INSERT INTO user (id, username) VALUES ('user', 'user')")
+            db.execute(
+                "INSERT INTO event (id, user_id, name, start, finish) VALUES ('event', 'user', 'Event', ?, ?)",
+                (datetime.datetime.fromtimestamp(start_ms / 1000),
+                 datetime.datetime.fromtimestamp((start_ms + 1800_000) / 1000)))
+            for camera_id in (device_id_1, device_id_2):
+                db.execute("INSERT INTO camera (id, name) VALUES (?, 'Camera')", (camera_id,))
+                db.execute("INSERT INTO event_cameras VALUES ('event', ?)", (camera_id,))
+            update_rollups(db, [
+                (start_ms + 90_000, 0.5, device_id_1),
+                (start_ms + 150_000, 0.5, device_id_1),
+                (start_ms + 90_000, 0.5, device_id_2),
+                ])
+            db.commit()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 'user'
+        response = client.get('/event/coverage')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(start_ms, response.json['start_ms'])
+        [first, second] = [response.json['cameras'][camera_id] for camera_id in (device_id_1, device_id_2)]
+        self.assertListEqual(
+            [[start_ms, start_ms + 120_000], [start_ms + 600_000, start_ms + 660_000]], first['video'])
+        self.assertListEqual([[start_ms + 60_000, start_ms + 180_000]], first['analytics'])
+        self.assertListEqual([[start_ms + 60_000, start_ms + 120_000]], first['video_with_analytics'])
+        self.assertIsNone(second['video'])
+        self.assertListEqual([[start_ms + 60_000, start_ms + 120_000]], second['analytics'])
+        self.assertIsNone(second['video_with_analytics'])
@@ -0,0 +1,57 @@
+import gzip
+import unittest
+
+from flask import Flask, jsonify
+from werkzeug.http import http_date
+
+from flask_app.flaskr.caching import DataVersions, compress_response, conditional
+from flask_app.tests._plugin_metadata_sample import device_id_1
+
+
+class TestConditionalResponses(unittest.TestCase):
+
+    def setUp(self):
+        self.versions = DataVersions()
+        self.calls = 0
+        app = Flask(__name__)
+        app.config['DATA_VERSIONS'] = self.versions
+        app.after_request(compress_response)
+
+        @app.route('/camera_data/<string:camera_id>')
+        @conditional(lambda camera_id: [camera_id])
+        def camera_data(camera_id):
+            self.calls += 1
+            return jsonify([{'camera_id': camera_id, 'value': i} for i in range(100)])
+
+        self.client = app.test_client()
+
+    def test_unchanged_data_is_not_modified(self):
+        response = self.client.get(f'/camera_data/{device_id_1}')
+        self.assertEqual(200, response.status_code)
+        etag = response.headers['ETag']
+        response = self.client.get(f'/camera_data/{device_id_1}', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, self.calls)
+        self.versions.bump(device_id_1)
+        response = self.client.get(f'/camera_data/{device_id_1}', headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+        self.assertEqual(2, self.calls)
+
+    def test_changes_within_the_second_of_if_modified_since_are_modified(self):
+        self.versions._versions[device_id_1] = (1, 1_700_000_000.2)
+        response = self.client.get(f'/camera_data/{device_id_1}')
+        self.assertEqual(http_date(1_700_000_001), response.headers['Last-Modified'])
+        headers = {'If-Modified-Since': response.headers['Last-Modified']}
+        self.assertEqual(304, self.client.get(f'/camera_data/{device_id_1}', headers=headers).status_code)
+        self.versions._versions[device_id_1] = (2, 1_700_000_000.7)
+        headers = {'If-Modified-Since': http_date(1_700_000_000)}
+        self.assertEqual(200, self.client.get(f'/camera_data/{device_id_1}', headers=headers).status_code)
+
+    def test_response_is_compressed(self):
+        plain = self.client.get(f'/camera_data/{device_id_1}')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        compressed = self.client.get(f'/camera_data/{device_id_1}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', compressed.headers['Content-Encoding'])
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertEqual(plain.data, gzip.decompress(compressed.data))
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from flask_app import flaskr
+from flask_app.flaskr.db import EngagementRateWriter
+from flask_app.flaskr.engagement_rollup import query_history, rebuild_rollups
+from flask_app.tests._plugin_metadata_sample import device_id_1
+
+_SCHEMA_PATH = os.path.join(os.path.dirname(flaskr.__file__), 'crowdpulse_schema.sql')
+
+
+class TestEngagementRateWriter(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self._tmp_dir.name, 'test.sqlite')
+        with open(_SCHEMA_PATH) as schema_file:
+            schema = schema_file.read()
+        connection = sqlite3.connect(self.database)
+        connection.executescript(schema)
+        connection.close()
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_queued_rows_are_written_on_stop(self):
+        writer = EngagementRateWriter(self.database, {}, max_batch_size=100, max_latency_sec=10)
+        writer.start()
+        writer.write((timestamp_ms, 0.5, device_id_1) for timestamp_ms in range(0, 2500000, 2000))
+        writer.stop()
+        connection = sqlite3.connect(self.database)
+        [[row_count]] = connection.execute('SELECT COUNT(*) FROM camera_engagement_rate').fetchall()
+        connection.close()
+        self.assertEqual(1250, row_count)
+        self.assertEqual({'pending_rows': 0, 'written_rows': 1250, 'dropped_rows': 0}, writer.stats())
+
+    def test_rows_of_failed_batches_are_written_again(self):
+        writer = EngagementRateWriter(self.database, {'busy_timeout': 0}, max_latency_sec=0.05)
+        locking_connection = sqlite3.connect(self.database, isolation_level=None)
+        locking_connection.execute('BEGIN EXCLUSIVE')
+        writer.start()
+        writer.write((timestamp_ms, 0.5, device_id_1) for timestamp_ms in range(0, 20000, 2000))
+        time.sleep(0.3)
+        self.assertEqual(0, writer.stats()['written_rows'])
+        locking_connection.execute('COMMIT')
+        locking_connection.close()
+        writer.stop()
+        self.assertEqual({'pending_rows': 0, 'written_rows': 10, 'dropped_rows': 0}, writer.stats())
+
+    def test_rollups_follow_written_rows(self):
+        writer = EngagementRateWriter(self.database, {})
+        written = []
+        writer.add_written_listener(written.extend)
+        writer.start()
+        rates = [(timestamp_ms, (timestamp_ms // 2000) % 2, device_id_1) for timestamp_ms in range(0, 120000, 2000)]
+        writer.write(rates)
+        writer.write([(0, 1.0, device_id_1)])
+        writer.stop()
+        # The repeated row is neither counted nor passed on.
+        self.assertEqual(60, writer.stats()['written_rows'])
+        self.assertListEqual(rates, written)
+        connection = sqlite3.connect(self.database)
+        rebuilt = sqlite3.connect(':memory:')
+        connection.backup(rebuilt)
+        rebuild_rollups(rebuilt)
+        self.assertListEqual(
+            connection.execute('SELECT * FROM camera_engagement_rollup ORDER BY 1, 2, 3').fetchall(),
+            rebuilt.execute('SELECT * FROM camera_engagement_rollup ORDER BY 1, 2, 3').fetchall())
+        rebuilt.close()
+        resolution_ms, rows = query_history(
+            connection, device_id_1, since_ms=0, until_ms=120000, max_points=10, raw_resolution_ms=2000)
+        connection.close()
+        self.assertEqual(60000, resolution_ms)
+        self.assertListEqual([(0, 30, 15.0, 0.0, 1.0), (60000, 30, 15.0, 0.0, 1.0)], rows)
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from flask_app.flaskr.db import ConnectionPool
+from flask_app.flaskr.device_inventory import DeviceInventory
+from flask_app.flaskr.engagement_threshold import ThresholdCache
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+from flask_app.tests.test_db import _SCHEMA_PATH
+
+
+class _DevicesMediaserverApi:
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.calls = 0
+
+    def list_devices(self):
+        self.calls += 1
+        return self.devices
+
+
+class TestDeviceInventory(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_pool = ConnectionPool(os.path.join(directory.name, 'test.sqlite'), {})
+        self.addCleanup(self.db_pool.close)
+        db = self.db_pool.acquire()
+        with open(_SCHEMA_PATH) as schema_file:
+            db.executescript(schema_file.read())
+        db.execute("INSERT INTO camera (id, name, threshold) VALUES ('removed', 'Removed', 0.5)")
+        db.execute("INSERT INTO camera (id, name, threshold) VALUES (?, 'Entrance', 0.8)", (device_id_1,))
+        db.commit()
+        self.db_pool.release(db)
+
+    def test_only_changed_cameras_are_upserted(self):
+        api = _DevicesMediaserverApi([
+            {'id': device_id_1, 'name': 'Entrance', 'deviceType': 'Camera'},
+            {'id': device_id_2, 'name': 'Hall', 'deviceType': 'Camera'},
+            {'id': '{00000000-0000-0000-0000-000000000009}', 'name': 'Speaker', 'deviceType': 'IOModule'},
+            ])
+        threshold_cache = ThresholdCache()
+        db = self.db_pool.acquire()
+        self.assertIsNone(threshold_cache.get(db, device_id_2))
+        self.db_pool.release(db)
+        inventory = DeviceInventory(self.db_pool, threshold_cache)
+        self.assertDictEqual(
+            {'removed': 'Removed', device_id_1: 'Entrance', device_id_2: 'Hall'},
+            dict(inventory.get_cameras(api)))
+        api.devices[0] = {**api.devices[0], 'name': 'Main entrance'}
+        self.assertEqual(1, inventory.refresh(api))
+        self.assertEqual(0, inventory.refresh(api))
+        db = self.db_pool.acquire()
+        self.assertEqual(0.5, threshold_cache.get(db, device_id_2))
+        rows = db.execute('SELECT id, name, threshold FROM camera ORDER BY name').fetchall()
+        self.db_pool.release(db)
+        self.assertListEqual(
+            [(device_id_2, 'Hall', 0.5), (device_id_1, 'Main entrance', 0.8), ('removed', 'Removed', 0.5)],
+            [tuple(row) for row in rows])
+
+    def test_stale_cameras_are_served_while_refreshed(self):
+        api = _DevicesMediaserverApi([{'id': device_id_1, 'name': 'Entrance', 'deviceType': 'Camera'}])
+        inventory = DeviceInventory(self.db_pool, ThresholdCache(), ttl_sec=0)
+        inventory.get_cameras(api)
+        api.devices = [{'id': device_id_1, 'name': 'Main entrance', 'deviceType': 'Camera'}]
+        self.assertEqual('Entrance', inventory.get_cameras(api)[device_id_1])
+        self.assertEqual(1, api.calls)
@@ -0,0 +1,51 @@
+import time
+import unittest
+
+from flask_app.flaskr.engagement_buffer import EngagementBuffers, EngagementWindow
+from flask_app.flaskr.handle_metadata import process_plugin_metadata_track
+from flask_app.tests._plugin_metadata_sample import metadata_sample, device_id_1, device_id_2
+
+
+class TestEngagementBuffers(unittest.TestCase):
+
+    def test_windows_are_per_camera(self):
+        buffers = EngagementBuffers(flush_interval_ms=2000)
+        for raw_track in metadata_sample:
+            track_engagement = process_plugin_metadata_track(raw_track)
+            if track_engagement is not None:
+                self.assertIsNone(buffers.add(*track_engagement))
+        timestamp_ms = process_plugin_metadata_track(metadata_sample[0]).timestamp_ms
+        closed_window = buffers.add(timestamp_ms + 2000, 1.0, device_id_2)
+        self.assertEqual(EngagementWindow(timestamp_ms, 0.0, device_id_2, 2), closed_window)
+        self.assertListEqual(
+            [
+                EngagementWindow(timestamp_ms, 0.5, device_id_1, 2),
+                EngagementWindow(timestamp_ms + 2000, 1.0, device_id_2, 1),
+                ],
+            buffers.drain())
+        self.assertListEqual([], buffers.drain())
+
+    def test_quiet_camera_window_expires(self):
+        buffers = EngagementBuffers(flush_interval_ms=2000)
+        self.assertIsNone(buffers.add(1000, 1.0, device_id_1))
+        self.assertListEqual([], buffers.close_expired(time.monotonic()))
+        [(window, deadline)] = buffers.close_expired(time.monotonic() + 2)
+        self.assertEqual(EngagementWindow(1000, 1.0, device_id_1, 1), window)
+        self.assertListEqual([], buffers.drain())
+
+    def test_recent_windows_are_summarized(self):
+        buffers = EngagementBuffers(flush_interval_ms=2000, recent_windows=2, max_idle_sec=30)
+        now = time.monotonic()
+        self.assertIsNone(buffers.summarize([device_id_1], 0, 10000, now))
+        buffers.add(1000, 1.0, device_id_1)
+        buffers.add(3000, 0.0, device_id_1, track_count=3)
+        buffers.add(3000, 2.0, device_id_2, track_count=2)
+        buffers.add(5000, 1.0, device_id_1)
+        buffers.drain()
+        self.assertIsNone(buffers.summarize([device_id_1], 0, 10000, now))
+        self.assertEqual((1.0, 4), buffers.summarize([device_id_1], 3000, 6000, now))
+        self.assertEqual((3.0, 6), buffers.summarize([device_id_1, device_id_2], 3000, 6000, now))
+        self.assertEqual((0.0, 0), buffers.summarize([device_id_2], 6000, 8000, now))
+        self.assertIsNone(buffers.summarize([device_id_2], 2000, 4000, now))
+        self.assertIsNone(buffers.summarize([device_id_1, '00000000-0000-0000-0000-000000000003'], 3000, 6000, now))
+        self.assertIsNone(buffers.summarize([device_id_1], 3000, 5000, now + 31))
@@ -0,0 +1,48 @@
+import unittest
+
+from flask_app.flaskr.engagement_stream import EngagementStream
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+
+
+class TestEngagementStream(unittest.TestCase):
+
+    def test_missed_events_are_replayed(self):
+        stream = EngagementStream(initial_event_id=0)
+        stream.publish(device_id_1, 'engagement', {'value': 10})
+        stream.publish(device_id_2, 'engagement', {'value': 20})
+        stream.publish(device_id_1, 'engagement', {'value': 30})
+        events = stream.events(device_id_1, last_event_id=1, heartbeat_sec=0.01)
+        self.assertEqual('retry: 3000\n\n', next(events))
+        self.assertEqual('id: 3\nevent: engagement\ndata: {"value": 30}\n\n', next(events))
+        self.assertEqual(': heartbeat\n\n', next(events))
+        stream.publish(device_id_1, 'threshold', {'below': True})
+        self.assertEqual('id: 4\nevent: threshold\ndata: {"below": true}\n\n', next(events))
+        events.close()
+
+    def test_slow_subscriber_is_disconnected(self):
+        stream = EngagementStream(subscriber_queue_size=1, initial_event_id=0)
+        events = stream.events(device_id_1)
+        next(events)
+        stream.publish(device_id_1, 'engagement', {'value': 10})
+        stream.publish(device_id_1, 'engagement', {'value': 20})
+        with self.assertRaises(StopIteration):
+            next(events)
+        events = stream.events(device_id_1, last_event_id=0)
+        next(events)
+        self.assertEqual('id: 1\nevent: engagement\ndata: {"value": 10}\n\n', next(events))
+        self.assertEqual('id: 2\nevent: engagement\ndata: {"value": 20}\n\n', next(events))
+        events.close()
+
+    def test_event_ids_grow_across_restarts(self):
+        stream = EngagementStream()
+        events = stream.events(device_id_1)
+        next(events)
+        stream.publish(device_id_1, 'engagement', {'value': 10})
+        last_event_id = int(next(events).split('\n')[0].removeprefix('id: '))
+        events.close()
+        restarted_stream = EngagementStream()
+        restarted_stream.publish(device_id_1, 'engagement', {'value': 20})
+        events = restarted_stream.events(device_id_1, last_event_id=last_event_id)
+        next(events)
+        self.assertIn('data: {"value": 20}', next(events))
+        events.close()
@@ -0,0 +1,30 @@
+import sqlite3
+import unittest
+
+from flask_app.flaskr.engagement_threshold import ThresholdCache
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+
+
+class TestThresholdCache(unittest.TestCase):
+
+    def setUp(self):
+        self.db = sqlite3.connect(':memory:')
+        self.db.row_factory = sqlite3.Row
+        self.db.execute('CREATE TABLE camera (id TEXT PRIMARY KEY, threshold FLOAT)')
+        self.db.execute('INSERT INTO camera (id, threshold) VALUES (?, ?)', (device_id_1, 0.5))
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_threshold_is_read_once(self):
+        cache = ThresholdCache()
+        self.assertEqual(0.5, cache.get(self.db, device_id_1))
+        self.db.execute('UPDATE camera SET threshold = 0.7')
+        self.assertEqual(0.5, cache.get(self.db, device_id_1))
+        cache.set(device_id_1, 0.7)
+        self.assertEqual(0.7, cache.get(self.db, device_id_1))
+        self.assertIsNone(cache.get(self.db, device_id_2))
+        self.db.execute('INSERT INTO camera (id, threshold) VALUES (?, ?)', (device_id_2, 0.3))
+        self.assertIsNone(cache.get(self.db, device_id_2))
+        cache.invalidate(device_id_2)
+        self.assertEqual(0.3, cache.get(self.db, device_id_2))
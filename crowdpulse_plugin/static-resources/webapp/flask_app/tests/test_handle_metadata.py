@@ -1,7 +1,17 @@
+import json
 import unittest
 
-from flask_app.flaskr.handle_metadata import process_plugin_metadata_track, calculate_engagement
-from flask_app.tests._plugin_metadata_sample import metadata_sample
+from flask_app.flaskr.handle_metadata import (
+    TrackTypeIds,
+    calculate_average_engagement_rate,
+    process_plugin_metadata_track,
+    calculate_engagement,
+    decode_metadata_batch,
+    combine_track_engagements,
+    )
+from flask_app.flaskr.http.api.mediaserver import AnalyticsTrack
+from flask_app.flaskr.metadata_decoder import decode_track, decode_track_dict
+from flask_app.tests._plugin_metadata_sample import device_id_2, metadata_sample
 
 
 class TestPluginMetadataHandling(unittest.TestCase):
@@ -16,3 +26,63 @@ class TestPluginMetadataHandling(unittest.TestCase):
             engagement_snapshots.append(process_plugin_metadata_track(raw_track))
         actual_result = calculate_engagement(engagement_snapshots)
         self.assertListEqual(expected_result, actual_result)
+
+    def test_decode_metadata_batch(self):
+        expected_tracks = [decode_track_dict(raw_track) for raw_track in metadata_sample]
+        ndjson_body = '\n'.join(json.dumps(raw_track) for raw_track in metadata_sample).encode()
+        ndjson_tracks, ndjson_rejected = decode_metadata_batch(ndjson_body + b'\n{broken\n')
+        self.assertListEqual(expected_tracks, ndjson_tracks)
+        self.assertEqual(1, ndjson_rejected)
+        array_tracks, array_rejected = decode_metadata_batch(json.dumps([*metadata_sample, 1]).encode())
+        self.assertListEqual(expected_tracks, array_tracks)
+        self.assertEqual(1, array_rejected)
+
+    def test_fast_path_matches_json_decoding(self):
+        for raw_track in metadata_sample:
+            compact = json.dumps(raw_track).encode()
+            with self.subTest(track=raw_track['objectMetadataList'][0]['trackId']):
+                self.assertEqual(decode_track_dict(raw_track), decode_track(compact))
+                self.assertEqual(decode_track_dict(raw_track), decode_track(json.dumps(raw_track, indent=4).encode()))
+        escaped = json.dumps(metadata_sample[0]).replace('"deviceId"', '"device\\u0049d"')
+        self.assertEqual(decode_track_dict(metadata_sample[0]), decode_track(escaped.encode()))
+        with self.assertRaises(ValueError):
+            decode_track(b'{"deviceId": "not-a-uuid"}')
+        # Truncated packets are rejected, even though all fields are there.
+        with self.assertRaises(ValueError):
+            decode_track(compact[:-1])
+        # Keys of nested objects are not taken for the top-level ones.
+        nested = {'source': {'deviceId': device_id_2, 'timestampUs': '1'}, **metadata_sample[0]}
+        self.assertEqual(decode_track_dict(nested), decode_track(json.dumps(nested).encode()))
+
+    def test_all_packet_objects_are_counted(self):
+        [attentive_packet, distracted_packet, unknown_packet, *_] = metadata_sample
+        crowded_packet = {
+            **attentive_packet,
+            'objectMetadataList': [
+                *attentive_packet['objectMetadataList'],
+                *distracted_packet['objectMetadataList'],
+                *unknown_packet['objectMetadataList'],
+                *attentive_packet['objectMetadataList'],
+                ],
+            }
+        self.assertEqual(decode_track_dict(crowded_packet), decode_track(json.dumps(crowded_packet).encode()))
+        track_engagement = process_plugin_metadata_track(crowded_packet)
+        self.assertEqual(2, track_engagement.attentive_count)
+        self.assertEqual(3, track_engagement.object_count)
+        combined = combine_track_engagements(
+            [track_engagement, None, process_plugin_metadata_track(distracted_packet)])
+        self.assertListEqual([track_engagement._replace(object_count=4)], combined)
+        self.assertListEqual([(0.5, track_engagement.camera_id)], calculate_engagement(combined))
+
+    def test_average_engagement_rate_of_analytics_tracks(self):
+        tracks = [
+            AnalyticsTrack({
+                'id': '{00000000-0000-0000-0000-%012d}' % index,
+                'objectTypeId': type_id,
+                'firstAppearanceTimeUs': 0,
+                'lastAppearanceTimeUs': 1000,
+                })
+            for index, type_id in enumerate([
+                TrackTypeIds.ATTENTIVE, TrackTypeIds.DISTRACTED, TrackTypeIds.ATTENTIVE, TrackTypeIds.ATTENTIVE,
+                'nx.base.Person'])]
+        self.assertEqual(0.75, calculate_average_engagement_rate(tracks))
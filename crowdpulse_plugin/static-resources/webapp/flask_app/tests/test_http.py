@@ -0,0 +1,104 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask_app.flaskr.http import http_request
+from flask_app.flaskr.http.api.plugin import PluginApi
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        if self.path.endswith('/array'):
+            self._send_chunked([b' [{"name": "caf', '\u00e9'.encode()[:1], '\u00e9'.encode()[1:], b'"}, 12', b'34, [1, 2] ', b']'])
+            return
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path.endswith('/close'):
+            self.close_connection = True
+
+    def _send_chunked(self, chunks):
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_POST(self):
+        self.server.posted.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 64
+
+
+class _LocalServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _KeepAliveHandler)
+        self.server.client_ports = []
+        self.server.posted = []
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHttpConnectionPool(_LocalServerTestCase):
+
+    def test_connection_is_reused(self):
+        for _ in range(3):
+            response = http_request('GET', f'{self.url}/', ssl_enabled=False)
+            self.assertEqual({'ok': True}, response.json)
+        self.assertEqual(1, len(set(self.server.client_ports)))
+
+    def test_connection_closed_by_server_is_replaced(self):
+        http_request('GET', f'{self.url}/close', ssl_enabled=False)
+        response = http_request('GET', f'{self.url}/', ssl_enabled=False)
+        self.assertEqual({'ok': True}, response.json)
+        self.assertEqual(2, len(set(self.server.client_ports)))
+
+
+class TestStreamedResponse(_LocalServerTestCase):
+
+    def test_array_elements_spanning_chunks(self):
+        response = http_request('GET', f'{self.url}/array', ssl_enabled=False, stream=True)
+        self.assertTrue(response.starts_json_array())
+        self.assertListEqual(
+            [{'name': 'caf\u00e9'}, 1234, [1, 2]], list(response.iter_json_array(chunk_size=3)))
+        self.assertFalse(response.is_streamed)
+        http_request('GET', f'{self.url}/', ssl_enabled=False)
+        # A streamed connection is closed, not reused.
+        self.assertEqual(2, len(set(self.server.client_ports)))
+
+    def test_object_is_read_whole(self):
+        response = http_request('GET', f'{self.url}/', ssl_enabled=False, stream=True)
+        self.assertFalse(response.starts_json_array())
+        self.assertEqual({'ok': True}, response.json)
+
+
+class TestPluginApi(_LocalServerTestCase):
+
+    def test_credentials_are_posted(self):
+        plugin_api = PluginApi(self.server.server_port)
+        plugin_api.send_credentials('admin', 'token')
+        self.assertListEqual([{'user': 'admin', 'token': 'token'}], self.server.posted)
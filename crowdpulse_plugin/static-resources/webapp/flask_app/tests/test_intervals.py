@@ -0,0 +1,64 @@
+import random
+import unittest
+
+from flask_app.flaskr.http.api.mediaserver import Interval, IntervalSet, TimePeriod
+
+
+def _covered_ms(intervals):
+    return {ms for start_ms, end_ms in intervals for ms in range(start_ms, end_ms)}
+
+
+class TestIntervalSet(unittest.TestCase):
+
+    def test_overlapping_and_touching_intervals_are_merged(self):
+        intervals = IntervalSet([Interval(20, 30), Interval(0, 10)])
+        intervals.add(Interval(10, 12))
+        intervals.add(Interval(25, 40))
+        intervals.add(Interval(50, 50))
+        self.assertListEqual([Interval(0, 12), Interval(20, 40)], list(intervals))
+        self.assertTrue(intervals.contains(Interval(21, 40)))
+        self.assertFalse(intervals.contains(Interval(5, 25)))
+        self.assertTrue(intervals.overlaps(Interval(11, 21)))
+        self.assertFalse(intervals.overlaps(Interval(12, 20)))
+        self.assertListEqual([Interval(12, 20), Interval(40, 45)], intervals.gaps(Interval(5, 45)))
+        self.assertEqual(32, intervals.total_ms())
+
+    def test_matches_brute_force(self):
+        randomizer = random.Random(0)
+
+        def random_intervals(count):
+            return [
+                Interval(start_ms, start_ms + randomizer.randrange(1, 20))
+                for start_ms in (randomizer.randrange(0, 200) for _ in range(count))]
+
+        for _ in range(50):
+            [first, second] = [random_intervals(15), random_intervals(15)]
+            added = IntervalSet()
+            for interval in first:
+                added.add(interval)
+            self.assertEqual(IntervalSet(first), added)
+            [first_set, second_set] = [IntervalSet(first), IntervalSet(second)]
+            self.assertEqual(_covered_ms(first) | _covered_ms(second), _covered_ms(first_set.union(second_set)))
+            self.assertEqual(
+                _covered_ms(first) & _covered_ms(second), _covered_ms(first_set.intersection(second_set)))
+            [query] = random_intervals(1)
+            self.assertEqual(set(range(*query)) - _covered_ms(first), _covered_ms(first_set.gaps(query)))
+            self.assertEqual(set(range(*query)) <= _covered_ms(first), first_set.contains(query))
+
+
+class TestTimePeriod(unittest.TestCase):
+
+    def test_consolidate(self):
+        periods = TimePeriod.list_from_filenames(
+            ['0_1000.mkv', '1000_500.mkv', '1200_100.mkv', '3000_500.mkv', '3600'])
+        self.assertListEqual([TimePeriod(0, 1500), TimePeriod(3000, 500), TimePeriod(3600)], periods)
+        # The recording still goes on.
+        self.assertListEqual([TimePeriod(0)], TimePeriod.consolidate(periods, tolerance_sec=2))
+        self.assertListEqual([1.5, 0.1], TimePeriod.calculate_gaps(periods))
+
+    def test_is_among(self):
+        periods = [TimePeriod(0, 10_000), TimePeriod(20_000, 10_000)]
+        interval_set = IntervalSet(period.interval() for period in periods)
+        for period, expected in [(TimePeriod(21_000, 9_500), True), (TimePeriod(5_000, 20_000), False)]:
+            self.assertEqual(expected, period.is_among(periods))
+            self.assertEqual(expected, period.is_among(interval_set))
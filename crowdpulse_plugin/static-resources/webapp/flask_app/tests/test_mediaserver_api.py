@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask_app.flaskr.http.api.mediaserver import AnalyticsTrack, MediaserverApiConnectionError, MediaserverApiV3
+from flask_app.flaskr.http.api.mediaserver._mediaserver_http_exceptions import (
+    MediaserverApiMalformedResponse,
+    MediaserverApiReadTimeout,
+    )
+
+
+def _track(start_ms, end_ms):
+    return AnalyticsTrack({
+        'id': '{00000000-0000-0000-0000-%012d}' % start_ms,
+        'objectTypeId': 'nx.base.Person',
+        'firstAppearanceTimeUs': start_ms * 1000,
+        'lastAppearanceTimeUs': end_ms * 1000,
+        'attributes': [],
+        })
+
+
+class _BrokenBodyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'[{"id": "{00000000-0000-0000-0000-000000000001}"}, {"id": ]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.flush()
+        if '/stalled' in self.path:
+            time.sleep(1)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestAnalyticsTrack(unittest.TestCase):
+
+    def test_positions_are_decoded_on_access(self):
+        raw_positions = [
+            {'timestampUs': 1_000_000, 'boundingBox': {'x': 0.1, 'y': 0.2, 'width': 0.3, 'height': 0.4}},
+            {'timestampUs': 1_040_000, 'boundingBox': {'x': 0.2, 'y': 0.2, 'width': 0.3, 'height': 0.4}},
+            ]
+        track = AnalyticsTrack({**_track(1000, 1040).raw(), 'objectPositionSequence': raw_positions})
+        self.assertEqual((1000, 1040), (track.start_ms, track.end_ms))
+        self.assertListEqual([0.1, 0.2, 0.3, 0.4, 0.2, 0.2, 0.3, 0.4], list(track.position_coordinates()))
+        self.assertListEqual([1_000_000, 1_040_000], list(track.position_timestamps_us()))
+        self.assertEqual(0.5, track.position_sequence()[1].x.end)
+        # Positions survive persisting the track after decoding.
+        restored = AnalyticsTrack(json.loads(json.dumps(track.raw())))
+        self.assertListEqual(list(track.position_coordinates()), list(restored.position_coordinates()))
+
+
+class TestMediaserverApiErrors(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _BrokenBodyHandler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.api = MediaserverApiV3(f'http://127.0.0.1:{self.server.server_port}', auth_type='no_auth')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_body_stalled_after_headers_is_a_read_timeout(self):
+        with self.assertRaises(MediaserverApiReadTimeout):
+            self.api.http_get('/stalled', ssl_enabled=False, timeout=0.2, stream=True)
+
+    def test_malformed_body_is_a_mediaserver_error(self):
+        with self.assertRaises(MediaserverApiMalformedResponse) as raised:
+            list(self.api.http_get('/malformed', ssl_enabled=False, stream=True))
+        self.assertIsInstance(raised.exception, MediaserverApiConnectionError)
+        with self.assertRaises(MediaserverApiMalformedResponse):
+            self.api.http_get('/malformed', ssl_enabled=False)
@@ -0,0 +1,85 @@
+import sqlite3
+import unittest
+
+from flask_app.flaskr.engagement_rollup import query_history, update_rollups
+from flask_app.flaskr.retention import apply_retention, pruned_before_ms
+from flask_app.tests._plugin_metadata_sample import device_id_1
+from flask_app.tests.test_db import _SCHEMA_PATH
+
+_DAY_MS = 24 * 3600 * 1000
+
+
+class TestRetention(unittest.TestCase):
+
+    def test_expired_rows_are_deleted(self):
+        connection = sqlite3.connect(':memory:')
+        with open(_SCHEMA_PATH) as schema_file:
+            connection.executescript(schema_file.read())
+        now_ms = 30 * _DAY_MS
+        rates = [(timestamp_ms, 0.5, device_id_1) for timestamp_ms in range(0, now_ms, 600_000)]
+        with connection:
+            connection.executemany('INSERT INTO camera_engagement_rate VALUES (?, ?, ?)', rates)
+            update_rollups(connection, rates)
+        result = apply_retention(
+            connection,
+            now_ms=now_ms,
+            raw_retention_days=7,
+            rollup_retention_days={10_000: 1, 60_000: None},
+            batch_size=100,
+            )
+        self.assertEqual(len(rates) - 7 * 24 * 6, result['deleted_raw_rows'])
+        self.assertEqual(len(rates) - 24 * 6, result['deleted_rollup_rows'])
+        [[oldest_raw_ms]] = connection.execute('SELECT MIN(timestamp_) FROM camera_engagement_rate').fetchall()
+        self.assertEqual(now_ms - 7 * _DAY_MS, oldest_raw_ms)
+        [[minute_buckets]] = connection.execute(
+            'SELECT COUNT(*) FROM camera_engagement_rollup WHERE resolution_ms = 60000').fetchall()
+        self.assertEqual(len(rates), minute_buckets)
+        connection.close()
+
+    def test_full_vacuum_runs_only_when_allowed(self):
+        connection = sqlite3.connect(':memory:')
+        with open(_SCHEMA_PATH) as schema_file:
+            connection.executescript(schema_file.read())
+        retention = {'raw_retention_days': 7, 'rollup_retention_days': {}}
+        apply_retention(connection, now_ms=_DAY_MS, **retention)
+        [[auto_vacuum]] = connection.execute('PRAGMA auto_vacuum').fetchall()
+        self.assertEqual(0, auto_vacuum)
+        apply_retention(connection, now_ms=_DAY_MS, allow_full_vacuum=True, **retention)
+        [[auto_vacuum]] = connection.execute('PRAGMA auto_vacuum').fetchall()
+        self.assertEqual(2, auto_vacuum)
+        connection.close()
+
+    def test_history_of_expired_raw_rows_comes_from_rollups(self):
+        connection = sqlite3.connect(':memory:')
+        with open(_SCHEMA_PATH) as schema_file:
+            connection.executescript(schema_file.read())
+        now_ms = 10 * _DAY_MS
+        rates = [(timestamp_ms, 0.5, device_id_1) for timestamp_ms in range(0, now_ms, 60_000)]
+        with connection:
+            connection.executemany('INSERT INTO camera_engagement_rate VALUES (?, ?, ?)', rates)
+            update_rollups(connection, rates)
+        config = {
+            'ENGAGEMENT_FLUSH_INTERVAL_MS': 2000,
+            'ENGAGEMENT_RAW_RETENTION_DAYS': 7,
+            'ENGAGEMENT_ROLLUP_RETENTION_DAYS': {10_000: 8, 60_000: None},
+            }
+        apply_retention(
+            connection,
+            now_ms=now_ms,
+            raw_retention_days=config['ENGAGEMENT_RAW_RETENTION_DAYS'],
+            rollup_retention_days=config['ENGAGEMENT_ROLLUP_RETENTION_DAYS'],
+            )
+        since_ms = now_ms - 9 * _DAY_MS
+        resolution_ms, rows = query_history(
+            connection, device_id_1, since_ms, since_ms + 600_000, max_points=300, raw_resolution_ms=2000,
+            pruned_before_ms=pruned_before_ms(config, now_ms))
+        self.assertEqual(60_000, resolution_ms)
+        self.assertEqual(10, len(rows))
+        # Within raw retention, raw rows are still used.
+        since_ms = now_ms - _DAY_MS
+        resolution_ms, rows = query_history(
+            connection, device_id_1, since_ms, since_ms + 600_000, max_points=300, raw_resolution_ms=2000,
+            pruned_before_ms=pruned_before_ms(config, now_ms))
+        self.assertEqual(2000, resolution_ms)
+        self.assertEqual(10, len(rows))
+        connection.close()
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from flask_app.flaskr.http.api.mediaserver import AnalyticsTrack
+from flask_app.flaskr.track_cache import TrackRangeCache
+from flask_app.tests._plugin_metadata_sample import device_id_1
+
+
+def _track(start_ms, duration_ms=100):
+    return AnalyticsTrack({
+        'id': '{00000000-0000-0000-0000-%012d}' % (start_ms % 10 ** 12),
+        'objectTypeId': 'nx.base.Person',
+        'firstAppearanceTimeUs': start_ms * 1000,
+        'lastAppearanceTimeUs': (start_ms + duration_ms) * 1000,
+        })
+
+
+class _RangeMediaserverApi:
+
+    def __init__(self, track_starts_ms):
+        self._tracks = [_track(start_ms) for start_ms in track_starts_ms]
+        self.requested_ranges = []
+
+    def list_analytics_objects_tracks(self, camera_id, start_time, end_time, timeout=None):
+        self.requested_ranges.append((start_time, end_time))
+        return [
+            track for track in self._tracks
+            if track.time_period().start_ms <= end_time and track.time_period().end_ms >= start_time]
+
+
+class TestTrackRangeCache(unittest.TestCase):
+
+    def test_only_gaps_are_fetched(self):
+        past_ms = int(time.time() * 1000) - 3600_000
+        api = _RangeMediaserverApi([past_ms + 1000, past_ms + 5000, past_ms + 9000])
+        cache = TrackRangeCache()
+        tracks = cache.get_tracks(api, device_id_1, past_ms, past_ms + 4000)
+        self.assertEqual(1, len(tracks))
+        tracks = cache.get_tracks(api, device_id_1, past_ms + 6000, past_ms + 10000)
+        self.assertEqual(1, len(tracks))
+        tracks = cache.get_tracks(api, device_id_1, past_ms, past_ms + 10000)
+        self.assertListEqual(
+            [past_ms + 1000, past_ms + 5000, past_ms + 9000],
+            [track.time_period().start_ms for track in tracks])
+        self.assertListEqual(
+            [
+                (past_ms, past_ms + 4000),
+                (past_ms + 6000, past_ms + 10000),
+                (past_ms + 4000, past_ms + 6000),
+                ],
+            api.requested_ranges)
+        cache.get_tracks(api, device_id_1, past_ms + 2000, past_ms + 8000)
+        self.assertEqual(3, len(api.requested_ranges))
+
+    def test_recent_tracks_are_not_cached(self):
+        now_ms = int(time.time() * 1000)
+        api = _RangeMediaserverApi([now_ms - 120_000, now_ms - 1000])
+        cache = TrackRangeCache(settle_sec=60)
+        self.assertEqual(2, len(cache.get_tracks(api, device_id_1, now_ms - 180_000, now_ms)))
+        self.assertEqual(2, len(cache.get_tracks(api, device_id_1, now_ms - 180_000, now_ms)))
+        [[_, settled_ms], [recent_start_ms, _], *refetched_ranges] = api.requested_ranges
+        self.assertEqual(settled_ms, recent_start_ms)
+        # Only the settled range is not fetched again.
+        self.assertTrue(all(start_ms >= settled_ms for start_ms, _ in refetched_ranges))
+
+    def test_ongoing_tracks_are_not_cached(self):
+        now_ms = int(time.time() * 1000)
+        api = _RangeMediaserverApi([now_ms - 300_000])
+        api._tracks.append(_track(now_ms - 200_000, duration_ms=200_000))
+        cache = TrackRangeCache(settle_sec=60)
+        [_, ongoing] = cache.get_tracks(api, device_id_1, now_ms - 360_000, now_ms - 120_000)
+        self.assertEqual(now_ms, ongoing.end_ms)
+        api._tracks[1] = _track(now_ms - 200_000, duration_ms=250_000)
+        [_, ongoing] = cache.get_tracks(api, device_id_1, now_ms - 360_000, now_ms - 120_000)
+        self.assertEqual(now_ms + 50_000, ongoing.end_ms)
+        # The period before the ongoing track started is covered.
+        self.assertEqual((now_ms - 200_000, now_ms - 120_000), api.requested_ranges[-1])
+
+    def test_settled_tracks_past_range_end_are_cached(self):
+        past_ms = int(time.time() * 1000) - 3600_000
+        api = _RangeMediaserverApi([])
+        api._tracks.append(_track(past_ms + 1000, duration_ms=5000))
+        cache = TrackRangeCache()
+        cache.get_tracks(api, device_id_1, past_ms, past_ms + 2000)
+        self.assertEqual(1, len(cache.get_tracks(api, device_id_1, past_ms, past_ms + 2000)))
+        self.assertEqual(1, len(api.requested_ranges))
+
+    def test_persisted_tracks_are_reused(self):
+        past_ms = int(time.time() * 1000) - 3600_000
+        api = _RangeMediaserverApi([past_ms + 1000])
+        with tempfile.TemporaryDirectory() as directory:
+            TrackRangeCache(directory=directory).get_tracks(api, device_id_1, past_ms, past_ms + 2000)
+            tracks = TrackRangeCache(directory=directory).get_tracks(api, device_id_1, past_ms, past_ms + 2000)
+        self.assertEqual([past_ms + 1000], [track.time_period().start_ms for track in tracks])
+        self.assertEqual(1, len(api.requested_ranges))
+
+    def test_oldest_tracks_beyond_max_tracks_are_forgotten(self):
+        past_ms = int(time.time() * 1000) - 3600_000
+        api = _RangeMediaserverApi([past_ms + 1000, past_ms + 5000, past_ms + 9000])
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TrackRangeCache(max_tracks=2, directory=directory)
+            self.assertEqual(2, len(cache.get_tracks(api, device_id_1, past_ms, past_ms + 6000)))
+            # All tracks are returned, only the newest are kept.
+            self.assertEqual(3, len(cache.get_tracks(api, device_id_1, past_ms, past_ms + 10000)))
+            [path] = [os.path.join(directory, name) for name in os.listdir(directory)]
+            with open(path) as f:
+                [line] = f.readlines()
+            self.assertEqual(2, len(json.loads(line)['tracks']))
+            cache.get_tracks(api, device_id_1, past_ms + 5000, past_ms + 10000)
+            self.assertEqual(2, len(api.requested_ranges))
+            cache.get_tracks(api, device_id_1, past_ms, past_ms + 2000)
+            # Only up to where the forgotten track ended.
+            self.assertEqual((past_ms, past_ms + 1101), api.requested_ranges[-1])
+            # A file written under a higher limit is cut down as it is loaded.
+            TrackRangeCache(max_tracks=1, directory=directory).get_tracks(
+                api, device_id_1, past_ms + 9000, past_ms + 10000)
+            with open(path) as f:
+                [line] = f.readlines()
+            [raw_track] = json.loads(line)['tracks']
+            self.assertEqual((past_ms + 9000) * 1000, raw_track['firstAppearanceTimeUs'])
@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+from flask_app.flaskr.http.api.mediaserver import AnalyticsTrack, MediaserverApiConnectionError
+from flask_app.flaskr.track_fetcher import AnalyticsTrackFetcher
+from flask_app.tests._plugin_metadata_sample import device_id_1, device_id_2
+
+
+def _track(start_ms, duration_ms=100):
+    return AnalyticsTrack({
+        'id': '{00000000-0000-0000-0000-%012d}' % start_ms,
+        'objectTypeId': 'nx.base.Person',
+        'firstAppearanceTimeUs': start_ms * 1000,
+        'lastAppearanceTimeUs': (start_ms + duration_ms) * 1000,
+        })
+
+
+class _FakeMediaserverApi:
+
+    def __init__(self, tracks):
+        self._tracks = tracks
+        self.unblocked = threading.Event()
+
+    def list_analytics_objects_tracks(self, camera_id, start_time, timeout, end_time=None):
+        tracks = self._tracks[camera_id]
+        if tracks == 'hang':
+            self.unblocked.wait(timeout)
+            return []
+        if isinstance(tracks, Exception):
+            raise tracks
+        return tracks
+
+
+class _RangeMediaserverApi:
+
+    def __init__(self, tracks):
+        self._tracks = tracks
+
+    def list_analytics_objects_tracks(self, camera_id, start_time, timeout, end_time=None):
+        return [t for t in self._tracks[camera_id] if t.start_ms <= end_time and t.end_ms >= start_time]
+
+
+class TestAnalyticsTrackFetcher(unittest.TestCase):
+
+    def test_tracks_are_merged_in_order(self):
+        fetcher = AnalyticsTrackFetcher(max_workers=2)
+        api = _FakeMediaserverApi({
+            device_id_1: [_track(1000), _track(3000)],
+            device_id_2: [_track(2000), _track(4000)],
+            })
+        fetched = fetcher.fetch(api, [device_id_1, device_id_2], 0)
+        self.assertListEqual(
+            [1000, 2000, 3000, 4000], [t.time_period().start_ms for t in fetched.tracks])
+        self.assertListEqual([], list(fetched.failed_camera_ids))
+        fetcher.shutdown()
+
+    def test_failed_cameras_are_reported(self):
+        fetcher = AnalyticsTrackFetcher(max_workers=3, timeout_sec=5, deadline_sec=0.2)
+        api = _FakeMediaserverApi({
+            device_id_1: [_track(1000)],
+            device_id_2: MediaserverApiConnectionError('localhost:7001', 'Connection refused'),
+            'slow_camera': 'hang',
+            })
+        fetched = fetcher.fetch(api, [device_id_1, device_id_2, 'slow_camera'], 0)
+        api.unblocked.set()
+        self.assertListEqual([1000], [t.time_period().start_ms for t in fetched.tracks])
+        self.assertListEqual([device_id_2, 'slow_camera'], list(fetched.failed_camera_ids))
+        fetcher.shutdown()
+
+    def test_chunks_yield_each_track_once(self):
+        fetcher = AnalyticsTrackFetcher(max_workers=2)
+        api = _RangeMediaserverApi({
+            device_id_1: [_track(500, duration_ms=1500), _track(2500)],
+            device_id_2: [_track(1500), _track(2999)],
+            })
+        chunks = list(fetcher.fetch_chunks(api, [device_id_1, device_id_2], 0, 3000, chunk_ms=1000))
+        self.assertListEqual(
+            [[500], [1500], [2500, 2999]],
+            [[t.start_ms for t in fetched.tracks] for fetched in chunks])
+        fetcher.shutdown()